@@ -0,0 +1,46 @@
+"""Time the filename timestamp parser against the old strptime parse.
+
+Run from the repository root with `python bench/bench_timestamps.py`. The
+module is loaded on its own so Home Assistant doesn't need to be installed.
+"""
+import importlib.util
+import os
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+spec = importlib.util.spec_from_file_location(
+    "timestamps", os.path.join(HERE, "..", "custom_components", "foscam", "timestamps.py")
+)
+timestamps = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(timestamps)
+
+COUNT = 10000
+
+
+def names():
+    """Recordings with underscores and snapshots with a hyphen before the time."""
+    clock = [f"{n // 3600 % 24:02}{n // 60 % 60:02}{n % 60:02}" for n in range(COUNT)]
+    recordings = [f"/IPCamera/FI9900P_00626E000000/record/20230101/2023010{n % 9 + 1}/"
+                  f"MDalarm_2023010{n % 9 + 1}_{clock[n]}.avi" for n in range(COUNT)]
+    snapshots = [f"/IPCamera/FI9900P_00626E000000/snap/20230101/2023010{n % 9 + 1}/"
+                 f"MDAlarm_2023010{n % 9 + 1}-{clock[n]}.jpg" for n in range(COUNT)]
+    return recordings + snapshots
+
+
+def main():
+    paths = names()
+    assert all(timestamps.parse_datetime(path) == timestamps._strptime(path) for path in paths)
+
+    def uncached():
+        timestamps.parse_datetime.cache_clear()
+        for path in paths:
+            timestamps.parse_datetime(path)
+
+    for label, run in (("strptime", lambda: [timestamps._strptime(path) for path in paths]),
+                       ("sliced", uncached),
+                       ("cached", lambda: [timestamps.parse_datetime(path) for path in paths])):
+        print(f"{label:>10}: {min(timeit.repeat(run, number=1, repeat=5)) * 1000:.1f}ms for {len(paths)} names")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,18 +3,94 @@
 from datetime import timedelta
 
 from libpyfoscam import FoscamCamera
+import voluptuous as vol
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import CONF_HOST, CONF_PASSWORD, CONF_PORT, CONF_USERNAME
 from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import config_validation as cv
 from homeassistant.helpers.entity_registry import async_migrate_entries
+from homeassistant.helpers.storage import Store
 
-from .updater import Updater
+from .updater import STORAGE_VERSION, RecordingsUpdater, Updater
 from .config_flow import DEFAULT_RTSP_PORT
-from .const import CONF_RTSP_PORT, DOMAIN, LOGGER, SERVICE_PTZ, SERVICE_PTZ_PRESET
+from .const import (
+    CONF_DOWNLOAD_RATE,
+    CONF_FRAME_GRABBER,
+    CONF_FRAME_GRABBER_IDLE,
+    CONF_IO_WORKERS,
+    CONF_MEDIA_CAMERA_LIMIT,
+    CONF_MEDIA_GLOBAL_LIMIT,
+    CONF_MEDIA_QUEUE_TIMEOUT,
+    CONF_RTSP_PORT,
+    CONF_TRANSCODE_WORKERS,
+    DATA_CONFIG,
+    DEFAULT_DOWNLOAD_RATE,
+    DEFAULT_FRAME_GRABBER_IDLE,
+    DEFAULT_IO_WORKERS,
+    DEFAULT_MEDIA_CAMERA_LIMIT,
+    DEFAULT_MEDIA_GLOBAL_LIMIT,
+    DEFAULT_MEDIA_QUEUE_TIMEOUT,
+    DEFAULT_TRANSCODE_WORKERS,
+    DOMAIN,
+    LOGGER,
+    SERVICE_PROFILE,
+    SERVICE_PTZ,
+    SERVICE_PTZ_PATH,
+    SERVICE_PTZ_PRESET,
+)
+from .executor import get_executors
+from .limiter import get_limiter
+from .profiler import Profiler
+from .ptz import PtzQueue
 
 PLATFORMS = ["camera", "binary_sensor", "sensor"]
 
+CONFIG_SCHEMA = vol.Schema(
+    {
+        DOMAIN: vol.Schema(
+            {
+                vol.Optional(CONF_IO_WORKERS, default=DEFAULT_IO_WORKERS): vol.All(
+                    vol.Coerce(int), vol.Range(min=1)
+                ),
+                vol.Optional(CONF_TRANSCODE_WORKERS, default=DEFAULT_TRANSCODE_WORKERS): vol.All(
+                    vol.Coerce(int), vol.Range(min=1)
+                ),
+                # KiB/s, 0 is unlimited
+                vol.Optional(CONF_DOWNLOAD_RATE, default=DEFAULT_DOWNLOAD_RATE): cv.positive_int,
+                vol.Optional(CONF_FRAME_GRABBER, default=False): cv.boolean,
+                vol.Optional(CONF_FRAME_GRABBER_IDLE, default=DEFAULT_FRAME_GRABBER_IDLE): cv.positive_int,
+                vol.Optional(CONF_MEDIA_GLOBAL_LIMIT, default=DEFAULT_MEDIA_GLOBAL_LIMIT): vol.All(
+                    vol.Coerce(int), vol.Range(min=1)
+                ),
+                vol.Optional(CONF_MEDIA_CAMERA_LIMIT, default=DEFAULT_MEDIA_CAMERA_LIMIT): vol.All(
+                    vol.Coerce(int), vol.Range(min=1)
+                ),
+                vol.Optional(CONF_MEDIA_QUEUE_TIMEOUT, default=DEFAULT_MEDIA_QUEUE_TIMEOUT): cv.positive_float,
+            }
+        )
+    },
+    extra=vol.ALLOW_EXTRA,
+)
+
+
+async def async_setup(hass: HomeAssistant, config):
+    """Create the executors and media limiter with the sizes from configuration.yaml."""
+    conf = config.get(DOMAIN, {})
+    hass.data[DATA_CONFIG] = conf
+    get_executors(
+        hass,
+        conf.get(CONF_IO_WORKERS, DEFAULT_IO_WORKERS),
+        conf.get(CONF_TRANSCODE_WORKERS, DEFAULT_TRANSCODE_WORKERS),
+    )
+    get_limiter(
+        hass,
+        conf.get(CONF_MEDIA_GLOBAL_LIMIT, DEFAULT_MEDIA_GLOBAL_LIMIT),
+        conf.get(CONF_MEDIA_CAMERA_LIMIT, DEFAULT_MEDIA_CAMERA_LIMIT),
+        conf.get(CONF_MEDIA_QUEUE_TIMEOUT, DEFAULT_MEDIA_QUEUE_TIMEOUT),
+    )
+    return True
+
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     """ Create camera and coordinator.
@@ -29,19 +105,40 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
             verbose=True,
             )
 
+    recordings = RecordingsUpdater(
+        hass,
+        camera,
+        get_executors(hass),
+        entry.entry_id,
+        hass.data.get(DATA_CONFIG, {}).get(CONF_DOWNLOAD_RATE, DEFAULT_DOWNLOAD_RATE) * 1024,
+    )
     coordinator = Updater(
         hass,
         camera,
-        5,
+        get_executors(hass),
+        entry.entry_id,
+        recordings,
     )
 
     hass.data.setdefault(DOMAIN, {})
     hass.data[DOMAIN][entry.entry_id] = {
             "camera": camera,
-            "coordinator": coordinator
+            "coordinator": coordinator,
+            "recordings": recordings,
+            "ptz": PtzQueue(hass, camera, entry.title),
+            "view_profiler": Profiler(hass, f"views_{entry.entry_id}"),
+            "grabber": None,
     }
 
+    # Only the device state holds up setup, recordings come from the cache
+    # until the first crawl, which runs in the background, finishes.
+    await recordings.async_load_cache()
     await coordinator.async_config_entry_first_refresh()
+    hass.async_create_task(recordings.async_refresh())
+
+    # The coordinator only polls while something listens, crawling and
+    # conversion have to carry on with the capture sensors disabled.
+    hass.data[DOMAIN][entry.entry_id]["recordings_unsub"] = recordings.async_add_listener(lambda: None)
 
     """Set up foscam entries from a config entry."""
     hass.config_entries.async_setup_platforms(entry, PLATFORMS)
@@ -53,15 +150,27 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Unload a config entry."""
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        data = hass.data[DOMAIN].pop(entry.entry_id)
+        data["recordings_unsub"]()
+        await hass.async_add_executor_job(data["recordings"].close_gallery)
+        data["ptz"].stop()
+        if data["grabber"] is not None:
+            await hass.async_add_executor_job(data["grabber"].stop)
 
         if not hass.data[DOMAIN]:
             hass.services.async_remove(domain=DOMAIN, service=SERVICE_PTZ)
             hass.services.async_remove(domain=DOMAIN, service=SERVICE_PTZ_PRESET)
+            hass.services.async_remove(domain=DOMAIN, service=SERVICE_PTZ_PATH)
+            hass.services.async_remove(domain=DOMAIN, service=SERVICE_PROFILE)
 
     return unload_ok
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry):
+    """Remove the cached recordings index."""
+    await Store(hass, STORAGE_VERSION, f"foscam.{entry.entry_id}.recordings").async_remove()
+
+
 async def async_migrate_entry(hass, config_entry: ConfigEntry):
     """Migrate old entry."""
     LOGGER.debug("Migrating from version %s", config_entry.version)
@@ -1,13 +1,13 @@
 
 from homeassistant.components.binary_sensor import BinarySensorEntity
-from homeassistant.helpers.update_coordinator import (
-    CoordinatorEntity,
-)
 
 from .const import (
     DOMAIN,
     LOGGER,
 )
+from .entity import (
+    FoscamCoordinatorEntity,
+)
 
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
@@ -23,7 +23,7 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
     async_add_entities(entries)
 
 
-class HassFoscamBinarySensor(CoordinatorEntity, BinarySensorEntity):
+class HassFoscamBinarySensor(FoscamCoordinatorEntity, BinarySensorEntity):
     """An implementation of a Foscam IP camera."""
 
     def __init__(self, data, config_entry, state_name, device_class):
@@ -32,6 +32,7 @@ class HassFoscamBinarySensor(CoordinatorEntity, BinarySensorEntity):
         self._name = f"{state_name} {config_entry.title}"
         self._unique_id = f"{state_name}_{config_entry.entry_id}"
         self._state_name = state_name
+        self._watched = (state_name,)
         self._device_class = device_class
         LOGGER.info(f"starting {self._name}")
 
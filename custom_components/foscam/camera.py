@@ -1,5 +1,7 @@
 """This component provides basic support for Foscam IP cameras."""
 import asyncio
+import os
+from bisect import bisect_left
 from datetime import datetime
 
 from aiohttp import web
@@ -17,6 +19,7 @@ from homeassistant.components.camera import (
 from homeassistant.components.camera.const import (
     CAMERA_IMAGE_TIMEOUT,
 )
+from homeassistant.components.http import KEY_AUTHENTICATED
 from homeassistant.config_entries import SOURCE_IMPORT
 from homeassistant.const import (
     CONF_HOST,
@@ -27,17 +30,52 @@ from homeassistant.const import (
 )
 from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers import config_validation as cv, entity_platform
-from homeassistant.helpers.update_coordinator import (
-    CoordinatorEntity,
-)
+from homeassistant.util import dt as dt_util
 
 from .const import (
+    CONF_FRAME_GRABBER,
+    CONF_FRAME_GRABBER_IDLE,
     CONF_RTSP_PORT,
     CONF_STREAM,
+    DATA_CONFIG,
+    DEFAULT_FRAME_GRABBER_IDLE,
     DOMAIN,
     LOGGER,
     SERVICE_PTZ,
+    SERVICE_PROFILE,
+    SERVICE_PTZ_PATH,
     SERVICE_PTZ_PRESET,
+    STREAMS,
+)
+from .entity import (
+    FoscamCoordinatorEntity,
+)
+from .ptz import (
+    MAX_TRAVEL_TIME,
+)
+from .executor import (
+    get_executors,
+)
+from .export import (
+    async_write_end,
+    async_write_file,
+)
+from .grabber import (
+    FrameGrabber,
+)
+from .limiter import (
+    Shed,
+    get_limiter,
+)
+from .sprite import (
+    SPRITE_HEIGHT,
+    SPRITE_WIDTH,
+    build_sprite,
+    sprite_layout,
+    sprite_offsets,
+)
+from .updater import (
+    BREAKER_CLOSED,
 )
 
 PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
@@ -61,24 +99,48 @@ DIR_TOPRIGHT = "top_right"
 DIR_BOTTOMLEFT = "bottom_left"
 DIR_BOTTOMRIGHT = "bottom_right"
 
-MOVEMENT_ATTRS = {
-    DIR_UP: "ptz_move_up",
-    DIR_DOWN: "ptz_move_down",
-    DIR_LEFT: "ptz_move_left",
-    DIR_RIGHT: "ptz_move_right",
-    DIR_TOPLEFT: "ptz_move_top_left",
-    DIR_TOPRIGHT: "ptz_move_top_right",
-    DIR_BOTTOMLEFT: "ptz_move_bottom_left",
-    DIR_BOTTOMRIGHT: "ptz_move_bottom_right",
-}
-
 DEFAULT_TRAVELTIME = 0.125
 
 ATTR_MOVEMENT = "movement"
 ATTR_TRAVELTIME = "travel_time"
 ATTR_PRESET_NAME = "preset_name"
-
-PTZ_GOTO_PRESET_COMMAND = "ptz_goto_preset"
+ATTR_PATH = "path"
+ATTR_WAIT = "wait"
+ATTR_CYCLES = "cycles"
+ATTR_TARGET = "target"
+
+PROFILE_UPDATER = "updater"
+PROFILE_VIEWS = "views"
+DEFAULT_PROFILE_CYCLES = 5
+
+DIRECTIONS = [
+    DIR_UP,
+    DIR_DOWN,
+    DIR_LEFT,
+    DIR_RIGHT,
+    DIR_TOPLEFT,
+    DIR_TOPRIGHT,
+    DIR_BOTTOMLEFT,
+    DIR_BOTTOMRIGHT,
+]
+
+SCHEMA_PTZ_PATH_STEP = vol.Any(
+    vol.Schema(
+        {
+            vol.Required(ATTR_MOVEMENT): vol.In(DIRECTIONS),
+            vol.Optional(ATTR_TRAVELTIME, default=DEFAULT_TRAVELTIME): vol.All(
+                vol.Coerce(float), vol.Range(min=0, max=MAX_TRAVEL_TIME)
+            ),
+            vol.Optional(ATTR_WAIT, default=0): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        }
+    ),
+    vol.Schema(
+        {
+            vol.Required(ATTR_PRESET_NAME): cv.string,
+            vol.Optional(ATTR_WAIT, default=0): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        }
+    ),
+)
 
 WS_TYPE_LIBRARY = "foscam_library"
 SCHEMA_WS_LIBRARY = websocket_api.BASE_COMMAND_MESSAGE_SCHEMA.extend(
@@ -89,8 +151,40 @@ SCHEMA_WS_LIBRARY = websocket_api.BASE_COMMAND_MESSAGE_SCHEMA.extend(
     }
 )
 
+WS_TYPE_SNAPSHOTS = "foscam_snapshots"
+SCHEMA_WS_SNAPSHOTS = websocket_api.BASE_COMMAND_MESSAGE_SCHEMA.extend(
+    {
+        vol.Required("type"): WS_TYPE_SNAPSHOTS,
+        vol.Required("entity_id"): cv.entity_id,
+        vol.Optional("cursor"): cv.string,
+        vol.Optional("limit", default=50): vol.All(vol.Coerce(int), vol.Range(min=1, max=500)),
+    }
+)
+
+WS_TYPE_HISTORY = "foscam_history"
+SCHEMA_WS_HISTORY = websocket_api.BASE_COMMAND_MESSAGE_SCHEMA.extend(
+    {
+        vol.Required("type"): WS_TYPE_HISTORY,
+        vol.Required("entity_id"): cv.entity_id,
+        vol.Optional("start_time"): cv.datetime,
+        vol.Optional("end_time"): cv.datetime,
+    }
+)
+
+# How close an event has to be to a recording's start to be matched with it.
+HISTORY_MATCH_SECONDS = 60
+
 RECORDING_URL = "/api/foscam_recording/{0}?index={1}&token={2}"
 RECORDING_THUMBNAIL_URL = "/api/foscam_snapshot/{0}?index={1}&token={2}"
+SUMMARY_URL = "/api/foscam_recording/{0}?day={1}&token={2}"
+SPRITE_URL = "/api/foscam_sprite/{0}?version={1}&start={2}&count={3}&token={4}"
+GALLERY_URL = "/api/foscam_gallery/{0}?name={1}&token={2}"
+GALLERY_DIR = "foscam/snap_{0}"
+
+EXPORT_CONVERT_TIMEOUT = 300
+
+SPRITE_TIMEOUT = 30
+SPRITE_CACHE_SIZE = 4
 
 
 async def async_setup_platform(hass, config, _async_add_entities, _discovery_info=None):
@@ -121,27 +215,25 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
     component = hass.data["camera"]
     hass.http.register_view(HassFoscamCameraImageView(component))
     hass.http.register_view(HassFoscamCameraRecordingView(component))
+    hass.http.register_view(HassFoscamCameraSpriteView(component))
+    hass.http.register_view(HassFoscamCameraExportView(component))
+    hass.http.register_view(HassFoscamCameraGalleryView(component))
     hass.components.websocket_api.async_register_command(
         WS_TYPE_LIBRARY, websocket_library, SCHEMA_WS_LIBRARY
     )
+    hass.components.websocket_api.async_register_command(
+        WS_TYPE_HISTORY, websocket_history, SCHEMA_WS_HISTORY
+    )
+    hass.components.websocket_api.async_register_command(
+        WS_TYPE_SNAPSHOTS, websocket_snapshots, SCHEMA_WS_SNAPSHOTS
+    )
 
     """Add a Foscam IP camera from a config entry."""
     platform = entity_platform.current_platform.get()
     platform.async_register_entity_service(
         SERVICE_PTZ,
         {
-            vol.Required(ATTR_MOVEMENT): vol.In(
-                [
-                    DIR_UP,
-                    DIR_DOWN,
-                    DIR_LEFT,
-                    DIR_RIGHT,
-                    DIR_TOPLEFT,
-                    DIR_TOPRIGHT,
-                    DIR_BOTTOMLEFT,
-                    DIR_BOTTOMRIGHT,
-                ]
-            ),
+            vol.Required(ATTR_MOVEMENT): vol.In(DIRECTIONS),
             vol.Optional(ATTR_TRAVELTIME, default=DEFAULT_TRAVELTIME): cv.small_float,
         },
         "async_perform_ptz",
@@ -155,29 +247,90 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
         "async_perform_ptz_preset",
     )
 
+    platform.async_register_entity_service(
+        SERVICE_PTZ_PATH,
+        {
+            vol.Required(ATTR_PATH): vol.All(cv.ensure_list, [SCHEMA_PTZ_PATH_STEP]),
+        },
+        "async_perform_ptz_path",
+    )
+
+    platform.async_register_entity_service(
+        SERVICE_PROFILE,
+        {
+            vol.Optional(ATTR_CYCLES, default=DEFAULT_PROFILE_CYCLES): vol.All(
+                vol.Coerce(int), vol.Range(min=1, max=100)
+            ),
+            vol.Optional(ATTR_TARGET, default=PROFILE_UPDATER): vol.In([PROFILE_UPDATER, PROFILE_VIEWS]),
+        },
+        "async_profile",
+    )
+
     data = hass.data[DOMAIN][config_entry.entry_id]
 
-    async_add_entities([HassFoscamCamera(data, config_entry)])
+    # The configured stream drives the main entity, the other stream gets a
+    # plain companion entity so previews can use Sub while recordings use Main.
+    entities = [HassFoscamCamera(data, config_entry)]
+    if config_entry.data[CONF_RTSP_PORT]:
+        other = [stream for stream in STREAMS if stream != config_entry.data[CONF_STREAM]]
+        entities.extend([HassFoscamStreamCamera(data, config_entry, stream) for stream in other])
+    async_add_entities(entities)
+
+
+def stream_url(entry_data, stream):
+    """Return the RTSP url for the Main or Sub stream, None without an RTSP port."""
+    if not entry_data[CONF_RTSP_PORT]:
+        return None
+    return (f"rtsp://{entry_data[CONF_USERNAME]}:{entry_data[CONF_PASSWORD]}@{entry_data[CONF_HOST]}:"
+            f"{entry_data[CONF_RTSP_PORT]}/video{stream}")
+
+
+def entry_grabber(hass, data, config_entry):
+    """Return the entry's Sub stream frame grabber, creating it on first use."""
+    if data["grabber"] is None:
+        url = stream_url(config_entry.data, "Sub")
+        if url is None:
+            return None
+        data["grabber"] = FrameGrabber(
+            config_entry.entry_id,
+            url,
+            hass.data.get(DATA_CONFIG, {}).get(CONF_FRAME_GRABBER_IDLE, DEFAULT_FRAME_GRABBER_IDLE),
+        )
+    return data["grabber"]
 
 
-class HassFoscamCamera(CoordinatorEntity, Camera):
+class HassFoscamCamera(FoscamCoordinatorEntity, Camera):
     """An implementation of a Foscam IP camera."""
 
+    _watched = ("state", "motion_status", "connection", "connection_failures")
+
     def __init__(self, data, config_entry):
         """Initialize a Foscam camera."""
-        CoordinatorEntity.__init__(self, data["coordinator"])
+        FoscamCoordinatorEntity.__init__(self, data["coordinator"])
         Camera.__init__(self)
 
+        self._data = data
+        self._config_entry = config_entry
+        self._entry_id = config_entry.entry_id
+        self._recordings_updater = data["recordings"]
         self._foscam_session = data["camera"]
+        self._ptz = data["ptz"]
+        self.view_profiler = data["view_profiler"]
         self._name = config_entry.title
-        self._username = config_entry.data[CONF_USERNAME]
-        self._password = config_entry.data[CONF_PASSWORD]
         self._stream = config_entry.data[CONF_STREAM]
         self._unique_id = config_entry.entry_id
         self._rtsp_port = config_entry.data[CONF_RTSP_PORT]
 
         self._image_source = None
 
+        # sprite layouts, finished sheets and the ones being built, keyed by
+        # catalog version, start and count
+        self._sprite_layouts = {}
+        self._sprites = {}
+        self._sprite_builds = {}
+
+        self._gallery_lock = asyncio.Lock()
+
         LOGGER.info(f"starting {self._name}")
 
     @property
@@ -185,12 +338,33 @@ class HassFoscamCamera(CoordinatorEntity, Camera):
         """Return the entity unique ID."""
         return self._unique_id
 
+    @property
+    def available(self):
+        """Stay available while the camera is down so the connection attributes show."""
+        return self.coordinator.data is not None
+
     @property
     def state(self):
+        if self.coordinator.data["connection"] != BREAKER_CLOSED:
+            return "unreachable"
         return self.coordinator.data["state"]
 
+    def _grabber(self):
+        """Return the entry's frame grabber if it's enabled."""
+        if not self.hass.data.get(DATA_CONFIG, {}).get(CONF_FRAME_GRABBER, False):
+            return None
+        return entry_grabber(self.hass, self._data, self._config_entry)
+
     def camera_image(self):
         """Return a still image response from the camera."""
+        # Use the last keyframe from the stream if we're grabbing them.
+        grabber = self._grabber()
+        if grabber is not None:
+            image = grabber.get()
+            if image is not None:
+                self._image_source = "stream/" + datetime.now().strftime("%m-%d %H:%M:%S")
+                return image
+
         # Send the request to snap a picture and return raw jpg data
         # Handle exception if host is not reachable or url failed
         result, response = self._foscam_session.snap_picture_2()
@@ -203,28 +377,147 @@ class HassFoscamCamera(CoordinatorEntity, Camera):
     def recording_image(self, index):
         """Return a still image response from the camera."""
         try:
-            with open(self.coordinator.data["recordings"][index].thumbnail_url, mode='rb') as file:
+            with open(self._recordings_updater.data["recordings"][index].thumbnail_url, mode='rb') as file:
                 return file.read()
         except:
             return None
 
     async def async_recording_image(self, index):
         """Return bytes of recording image."""
-        return await self.hass.async_add_executor_job(self.recording_image, index)
+        return await self.hass.async_add_executor_job(self._profiled, self.recording_image, index)
 
     def recording(self, index):
         """Return video response from the camera."""
-        filename = self.coordinator.data["recordings"][index].content_url
+        filename = self._recordings_updater.data["recordings"][index].content_url
         LOGGER.debug(f"trying {filename}")
         try:
-            with open(self.coordinator.data["recordings"][index].content_url, mode='rb') as file:
+            with open(self._recordings_updater.data["recordings"][index].content_url, mode='rb') as file:
                 return file.read()
         except:
             return None
 
     async def async_recording(self, index):
         """Return bytes of recording."""
-        return await self.hass.async_add_executor_job(self.recording, index)
+        return await self.hass.async_add_executor_job(self._profiled, self.recording, index)
+
+    def _profiled(self, target, *args):
+        """Run the blocking side of a view request under the view profiler."""
+        with self.view_profiler.cycle():
+            return target(*args)
+
+    def recordings_between(self, start, end):
+        """Return the recordings created in [start, end), oldest first."""
+        return [
+            r for r in reversed(self._recordings_updater.data["recordings"])
+            if (start is None or r.created_at >= start) and (end is None or r.created_at < end)
+        ]
+
+    async def async_ensure_recording(self, recording):
+        """Make sure a recording is converted, doing it now if the poll hasn't yet."""
+        executors = get_executors(self.hass)
+        if await executors.async_run_io(self.hass, self._recordings_updater.prepare_recording, recording):
+            await executors.async_run_transcode(self.hass, self._recordings_updater.convert_recording, recording)
+            return
+        await self._recordings_updater.async_wait_for_recording(recording, EXPORT_CONVERT_TIMEOUT)
+
+    def snapshot_page(self, cursor, limit):
+        """Return up to `limit` snapshots older than `cursor`, newest first.
+
+        The cursor is the created_at of the last snapshot of the previous page,
+        the returned cursor is None when there's nothing more.
+        """
+        snapshots = self._recordings_updater.data["snapshots"]
+        lo, hi = 0, len(snapshots)
+        if cursor is not None:
+            # list is newest first, find the first entry older than the cursor
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if snapshots[mid][0] >= cursor:
+                    lo = mid + 1
+                else:
+                    hi = mid
+        page = snapshots[lo:lo + limit]
+        more = lo + limit < len(snapshots)
+        return page, page[-1][0] if page and more else None
+
+    async def async_gallery_image(self, name):
+        """Return a gallery snapshot, fetching it from the camera the first time it's viewed."""
+        remote = self._recordings_updater.snapshot_path(name)
+        if remote is None:
+            return None
+
+        gallery_dir = GALLERY_DIR.format(self._entry_id)
+        local = os.path.join(gallery_dir, name)
+        if not await self.hass.async_add_executor_job(os.path.exists, local):
+            # one fetch at a time over the gallery's session, waiting here
+            # rather than in a pool thread
+            async with self._gallery_lock:
+                if not await self.hass.async_add_executor_job(os.path.exists, local):
+                    await self.hass.async_add_executor_job(os.makedirs, gallery_dir, 0o755, True)
+                    await get_executors(self.hass).async_run_io(
+                        self.hass, self._recordings_updater.fetch_snapshot, remote, local
+                    )
+
+        def _read():
+            with open(local, mode='rb') as file:
+                return file.read()
+        return await self.hass.async_add_executor_job(self._profiled, _read)
+
+    async def async_sprite_layout(self, start, count, version=None):
+        """Return the key and layout of the sprite sheet for a range of recordings.
+
+        The layout says which recordings made it onto the sheet. It is worked
+        out once per catalog version, so the offsets handed out with the
+        library keep matching the sheet even as thumbnails appear. Returns
+        None for an old version that was never laid out.
+        """
+        data = self._recordings_updater.data
+        current = data["recordings_version"]
+        if version is None:
+            version = current
+        key = (version, start, count)
+        if key not in self._sprite_layouts:
+            if version != current:
+                return None
+            recordings = data["recordings"]
+            layout = await self.hass.async_add_executor_job(sprite_layout, recordings, start, count)
+            self._sprite_layouts = {k: v for k, v in self._sprite_layouts.items() if k[0] >= version}
+            self._sprite_layouts.setdefault(key, (recordings, layout))
+        return key, self._sprite_layouts[key][1]
+
+    async def async_sprite(self, key):
+        """Return the sprite sheet laid out under `key`, building it if needed.
+
+        Sheets are kept until the recordings catalog changes.
+        """
+        if key in self._sprites:
+            return self._sprites[key]
+        if key not in self._sprite_layouts:
+            return None
+
+        build = self._sprite_builds.get(key)
+        if build is None:
+            recordings, layout = self._sprite_layouts[key]
+            build = self.hass.async_create_task(
+                get_executors(self.hass).async_run_transcode(
+                    self.hass, self._profiled, build_sprite, recordings, layout
+                )
+            )
+            self._sprite_builds[key] = build
+            build.add_done_callback(lambda task: self._sprite_built(key, task))
+        return await asyncio.shield(build)
+
+    def _sprite_built(self, key, task):
+        self._sprite_builds.pop(key, None)
+        if task.cancelled() or task.exception() is not None or task.result() is None:
+            return
+        current = self._recordings_updater.data["recordings_version"]
+        if key[0] < current:
+            return
+        self._sprites = {k: v for k, v in self._sprites.items() if k[0] >= current}
+        while len(self._sprites) >= SPRITE_CACHE_SIZE:
+            self._sprites.pop(next(iter(self._sprites)))
+        self._sprites[key] = task.result()
 
     @property
     def supported_features(self):
@@ -236,9 +529,7 @@ class HassFoscamCamera(CoordinatorEntity, Camera):
 
     async def stream_source(self):
         """Return the stream source."""
-        if self._rtsp_port:
-            return f"rtsp://{self._username}:{self._password}@{self._foscam_session.host}:{self._rtsp_port}/video{self._stream}"
-        return None
+        return stream_url(self._config_entry.data, self._stream)
 
     @property
     def motion_detection_enabled(self):
@@ -294,49 +585,70 @@ class HassFoscamCamera(CoordinatorEntity, Camera):
         await self.coordinator.async_request_refresh()
 
     async def async_perform_ptz(self, movement, travel_time):
-        """Perform a PTZ action on the camera."""
-        LOGGER.debug("PTZ action '%s' on %s", movement, self._name)
-
-        movement_function = getattr(self._foscam_session, MOVEMENT_ATTRS[movement])
-
-        ret, _ = await self.hass.async_add_executor_job(movement_function)
-
-        if ret != 0:
-            LOGGER.error("Error moving %s '%s': %s", movement, self._name, ret)
-            return
-
-        await asyncio.sleep(travel_time)
-
-        ret, _ = await self.hass.async_add_executor_job(
-            self._foscam_session.ptz_stop_run
-        )
-
-        if ret != 0:
-            LOGGER.error("Error stopping movement on '%s': %s", self._name, ret)
-            return
+        """Queue a PTZ action on the camera."""
+        self._ptz.move(movement, travel_time)
 
     async def async_perform_ptz_preset(self, preset_name):
-        """Perform a PTZ preset action on the camera."""
-        LOGGER.debug("PTZ preset '%s' on %s", preset_name, self._name)
+        """Queue a PTZ preset action on the camera."""
+        self._ptz.preset(preset_name)
 
-        preset_function = getattr(self._foscam_session, PTZ_GOTO_PRESET_COMMAND)
+    async def async_perform_ptz_path(self, path):
+        """Queue a sequence of PTZ actions on the camera."""
+        self._ptz.path(path)
 
-        ret, _ = await self.hass.async_add_executor_job(preset_function, preset_name)
-
-        if ret != 0:
-            LOGGER.error(
-                "Error moving to preset %s on '%s': %s", preset_name, self._name, ret
-            )
-            return
+    async def async_profile(self, cycles, target):
+        """Profile the next few updater cycles or view requests."""
+        if target == PROFILE_VIEWS:
+            self.view_profiler.start(cycles)
+        else:
+            self.coordinator.profiler.start(cycles)
+            self._recordings_updater.profiler.start(cycles)
 
     @property
     def name(self):
         """Return the name of this camera."""
         return self._name
 
+    def summary_path(self, day):
+        """Return where the summary for `day` lives."""
+        return self._recordings_updater.summaries.path(day)
+
+    @property
+    def entry_id(self):
+        return self._entry_id
+
+    @property
+    def recordings(self):
+        """Return the recordings, newest first."""
+        return self._recordings_updater.data["recordings"]
+
     def last_n_videos(self, at_most):
         """Return video response from the camera."""
-        return self.coordinator.data["recordings"][:at_most]
+        return self._recordings_updater.data["recordings"][:at_most]
+
+    def history(self, start, end):
+        """Return transitions between `start` and `end` matched with recordings."""
+        recordings = self._recordings_updater.data["recordings"]
+        starts = sorted((r.created_at.timestamp(), index) for index, r in enumerate(recordings))
+        times = [created for created, _ in starts]
+
+        events = []
+        matched = set()
+        for at, field, value in self.coordinator.history.query(start, end):
+            recording = None
+            i = bisect_left(times, at)
+            closest = [(abs(at - times[j]), starts[j][1]) for j in (i - 1, i)
+                       if 0 <= j < len(times) and abs(at - times[j]) <= HISTORY_MATCH_SECONDS]
+            if closest:
+                recording = min(closest)[1]
+                matched.add(recording)
+            events.append({
+                "at": datetime.fromtimestamp(at).isoformat(),
+                "field": field,
+                "value": value,
+                "recording": recording,
+            })
+        return events, sorted(matched)
 
     @property
     def image_source(self):
@@ -348,13 +660,111 @@ class HassFoscamCamera(CoordinatorEntity, Camera):
         attrs = {
             "last_video": RECORDING_URL.format(self.entity_id, 0, self.access_tokens[-1]),
             "last_thumbnail": RECORDING_THUMBNAIL_URL.format(self.entity_id, 0, self.access_tokens[-1]),
+            "today_summary": SUMMARY_URL.format(self.entity_id, datetime.now().strftime("%Y-%m-%d"),
+                                                self.access_tokens[-1]),
             "image_source": self.image_source,
+            "stream": self._stream,
             "state": self.state,
+            "connection": self.coordinator.data["connection"],
+            "connection_failures": self.coordinator.data["connection_failures"],
+            "connection_retry_in": self.coordinator.data["connection_retry_in"],
         }
         return attrs
 
 
-class HassFoscamCameraImageView(CameraView):
+class HassFoscamStreamCamera(FoscamCoordinatorEntity, Camera):
+    """A companion camera for the stream the main entity doesn't use.
+
+    It only streams and serves stills, the Sub companion takes them from the
+    Sub stream so dashboard tiles stay small. PTZ, motion detection and the
+    library stay on the main entity.
+    """
+
+    _watched = ("connection",)
+
+    def __init__(self, data, config_entry, stream):
+        FoscamCoordinatorEntity.__init__(self, data["coordinator"])
+        Camera.__init__(self)
+
+        self._data = data
+        self._config_entry = config_entry
+        self._foscam_session = data["camera"]
+        self._name = f"{config_entry.title} {stream}"
+        self._stream = stream
+        self._unique_id = f"{stream.lower()}_{config_entry.entry_id}"
+
+        LOGGER.info(f"starting {self._name}")
+
+    @property
+    def unique_id(self):
+        """Return the entity unique ID."""
+        return self._unique_id
+
+    @property
+    def name(self):
+        """Return the name of this camera."""
+        return self._name
+
+    @property
+    def supported_features(self):
+        """Return supported features."""
+        return SUPPORT_STREAM
+
+    async def stream_source(self):
+        """Return the stream source."""
+        return stream_url(self._config_entry.data, self._stream)
+
+    def camera_image(self):
+        """Return a still image, from the Sub stream when this is the Sub companion."""
+        if self._stream == "Sub":
+            image = entry_grabber(self.hass, self._data, self._config_entry).get()
+            if image is not None:
+                return image
+
+        # Main, or the grabber hasn't got a frame yet.
+        result, response = self._foscam_session.snap_picture_2()
+        if result != 0:
+            return None
+        return response
+
+    @property
+    def extra_state_attributes(self):
+        """Return the state attributes."""
+        return {
+            "stream": self._stream,
+            "connection": self.coordinator.data["connection"],
+        }
+
+
+class FoscamCameraView(CameraView):
+    """Base for the Foscam views.
+
+    Views with `limited` set wait for a slot in the media limiter. Requests
+    that can't get one in time get a 503 rather than piling up behind the
+    others.
+    """
+
+    limited = True
+
+    async def get(self, request: web.Request, entity_id: str) -> web.StreamResponse:
+        camera = self.component.get_entity(entity_id)
+        if not isinstance(camera, HassFoscamCamera):
+            raise web.HTTPNotFound()
+        # Check the token before queueing, otherwise anyone could fill the
+        # queue and get real clients shed.
+        if not request[KEY_AUTHENTICATED] and request.query.get("token") not in camera.access_tokens:
+            raise web.HTTPUnauthorized()
+        if not self.limited:
+            return await super().get(request, entity_id)
+        limiter = get_limiter(request.app["hass"])
+        try:
+            async with limiter.slot(camera.entry_id):
+                return await super().get(request, entity_id)
+        except Shed:
+            raise web.HTTPServiceUnavailable(headers={"Retry-After": str(limiter.retry_after)})
+
+
+class HassFoscamCameraImageView(FoscamCameraView):
     """Camera view to serve an image."""
 
     url = "/api/foscam_snapshot/{entity_id}"
@@ -373,14 +783,133 @@ class HassFoscamCameraImageView(CameraView):
         raise web.HTTPInternalServerError()
 
 
-class HassFoscamCameraRecordingView(CameraView):
+class HassFoscamCameraSpriteView(FoscamCameraView):
+    """Camera view to serve a sheet of recording thumbnails."""
+
+    url = "/api/foscam_sprite/{entity_id}"
+    name = "api:foscam:sprite"
+
+    async def handle(self, request: web.Request, camera: HassFoscamCamera) -> web.Response:
+        """Serve sprite sheet.
+
+        With `version` this is the sheet laid out for that catalog version,
+        404 once the catalog has moved on and the sheet is gone.
+        """
+        with suppress(asyncio.CancelledError, asyncio.TimeoutError):
+            version = int(request.query["version"]) if "version" in request.query else None
+            start = int(request.query.get("start", "0"))
+            count = int(request.query.get("count", "1"))
+            async with async_timeout.timeout(SPRITE_TIMEOUT):
+                laid_out = await camera.async_sprite_layout(start, count, version)
+                if laid_out is None:
+                    raise web.HTTPNotFound()
+                image = await camera.async_sprite(laid_out[0])
+
+            if image:
+                return web.Response(body=image, content_type="image/jpeg")
+
+        raise web.HTTPInternalServerError()
+
+
+class HassFoscamCameraGalleryView(FoscamCameraView):
+    """Camera view to serve a snapshot from the gallery."""
+
+    url = "/api/foscam_gallery/{entity_id}"
+    name = "api:foscam:gallery"
+
+    async def handle(self, request: web.Request, camera: HassFoscamCamera) -> web.Response:
+        """Serve gallery image."""
+        try:
+            name = request.query.get("name", "")
+            async with async_timeout.timeout(CAMERA_IMAGE_TIMEOUT):
+                image = await camera.async_gallery_image(name)
+        except asyncio.TimeoutError:
+            # the camera is slow, the snapshot is still there
+            raise web.HTTPGatewayTimeout()
+
+        if image:
+            return web.Response(body=image, content_type="image/jpeg")
+        raise web.HTTPNotFound()
+
+
+class HassFoscamCameraExportView(FoscamCameraView):
+    """Camera view to stream a tar of the recordings in a time range."""
+
+    url = "/api/foscam_export/{entity_id}"
+    name = "api:foscam:export"
+
+    # exports are long lived, they'd hold a slot for minutes
+    limited = False
+
+    @staticmethod
+    def _parse_time(value):
+        if value is None:
+            return None
+        parsed = dt_util.parse_datetime(value)
+        if parsed is None:
+            raise web.HTTPBadRequest()
+        if parsed.tzinfo is not None:
+            parsed = dt_util.as_local(parsed).replace(tzinfo=None)
+        return parsed
+
+    async def handle(self, request: web.Request, camera: HassFoscamCamera) -> web.StreamResponse:
+        """Stream the archive.
+
+        Files are read and written a chunk at a time so memory use doesn't
+        depend on how much is exported. Recordings that haven't been converted
+        yet are converted before they are added.
+        """
+        start = self._parse_time(request.query.get("start"))
+        end = self._parse_time(request.query.get("end"))
+        thumbnails = request.query.get("thumbnails", "0") in ("1", "true")
+
+        name = camera.entity_id.split(".")[-1]
+        response = web.StreamResponse(
+            headers={
+                "Content-Type": "application/x-tar",
+                "Content-Disposition": f'attachment; filename="{name}.tar"',
+            }
+        )
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+
+        for recording in camera.recordings_between(start, end):
+            try:
+                await camera.async_ensure_recording(recording)
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.warning(f"export failed to convert {recording.content_url}")
+            await async_write_file(request.app["hass"], response, recording.content_url,
+                                   f"{name}/{os.path.basename(recording.content_url)}")
+            if thumbnails:
+                await async_write_file(request.app["hass"], response, recording.thumbnail_url,
+                                       f"{name}/{os.path.basename(recording.thumbnail_url)}")
+
+        await async_write_end(response)
+        await response.write_eof()
+        return response
+
+
+class HassFoscamCameraRecordingView(FoscamCameraView):
     """Camera view to serve a recording."""
 
     url = "/api/foscam_recording/{entity_id}"
     name = "api:foscam:recording"
 
-    async def handle(self, request: web.Request, camera: HassFoscamCamera) -> web.Response:
-        """Serve camera image."""
+    async def handle(self, request: web.Request, camera: HassFoscamCamera) -> web.StreamResponse:
+        """Serve camera image.
+
+        With `day=YYYY-MM-DD` this serves that day's fast forward summary.
+        """
+        if "day" in request.query:
+            try:
+                day = datetime.strptime(request.query["day"], "%Y-%m-%d").date()
+            except ValueError:
+                raise web.HTTPBadRequest()
+            path = camera.summary_path(day)
+            if not await request.app["hass"].async_add_executor_job(os.path.exists, path):
+                raise web.HTTPNotFound()
+            return web.FileResponse(path, headers={"Content-Type": "video/mp4"})
+
         with suppress(asyncio.CancelledError, asyncio.TimeoutError):
             index = int(request.query.get("index", "0"))
             async with async_timeout.timeout(CAMERA_IMAGE_TIMEOUT):
@@ -392,15 +921,30 @@ class HassFoscamCameraRecordingView(CameraView):
         raise web.HTTPInternalServerError()
 
 
+def _library_camera(hass, entity_id):
+    """Return the main Foscam entity for `entity_id`, companions have no library."""
+    camera = hass.data["camera"].get_entity(entity_id)
+    if not isinstance(camera, HassFoscamCamera):
+        raise HomeAssistantError(f"{entity_id} has no recordings")
+    return camera
+
+
 @websocket_api.async_response
 async def websocket_library(hass, connection, msg):
     try:
-        camera = hass.data["camera"].get_entity(msg["entity_id"])
+        camera = _library_camera(hass, msg["entity_id"])
+
+        # Start building the sprite sheet now so it's ready when the grid asks.
+        recordings = camera.last_n_videos(msg["at_most"])
+        key, layout = await camera.async_sprite_layout(0, msg["at_most"])
+        offsets = sprite_offsets(layout)
+        if layout:
+            hass.async_create_task(camera.async_sprite(key))
 
         videos = []
         LOGGER.debug("library+" + str(msg["at_most"]))
         count = 0
-        for v in camera.last_n_videos(msg["at_most"]):
+        for v in recordings:
             videos.append(
                 {
                     "created_at": v.created_at,
@@ -414,6 +958,7 @@ async def websocket_library(hass, connection, msg):
                     "object_region": v.object_region,
                     "trigger": v.object_type,
                     "trigger_region": v.object_region,
+                    "sprite_offset": offsets.get(count),
                 }
             )
             count += 1
@@ -423,6 +968,10 @@ async def websocket_library(hass, connection, msg):
                 msg["id"],
                 {
                     "videos": videos,
+                    "sprite": SPRITE_URL.format(msg['entity_id'], key[0], 0, msg["at_most"],
+                                                camera.access_tokens[-1]),
+                    "sprite_width": SPRITE_WIDTH,
+                    "sprite_height": SPRITE_HEIGHT,
                 },
             )
         )
@@ -435,3 +984,83 @@ async def websocket_library(hass, connection, msg):
             )
         )
         LOGGER.warning("{} library websocket failed".format(msg["entity_id"]))
+
+
+@websocket_api.async_response
+async def websocket_history(hass, connection, msg):
+    try:
+        camera = _library_camera(hass, msg["entity_id"])
+
+        start = msg.get("start_time")
+        end = msg.get("end_time")
+        events, matched = camera.history(
+            start.timestamp() if start else None, end.timestamp() if end else None
+        )
+
+        recordings = camera.recordings
+        videos = [
+            {
+                "index": index,
+                "created_at": recordings[index].created_at,
+                "url": RECORDING_URL.format(msg['entity_id'], index, camera.access_tokens[-1]),
+                "thumbnail": RECORDING_THUMBNAIL_URL.format(msg['entity_id'], index, camera.access_tokens[-1]),
+            }
+            for index in matched
+        ]
+
+        connection.send_message(
+            websocket_api.result_message(
+                msg["id"],
+                {
+                    "events": events,
+                    "videos": videos,
+                },
+            )
+        )
+    except HomeAssistantError as error:
+        connection.send_message(
+            websocket_api.error_message(
+                msg["id"],
+                "history_ws",
+                "Unable to fetch history ({})".format(str(error)),
+            )
+        )
+        LOGGER.warning("{} history websocket failed".format(msg["entity_id"]))
+
+
+@websocket_api.async_response
+async def websocket_snapshots(hass, connection, msg):
+    try:
+        camera = _library_camera(hass, msg["entity_id"])
+
+        cursor = msg.get("cursor")
+        if cursor is not None:
+            cursor = datetime.fromisoformat(cursor)
+        page, next_cursor = camera.snapshot_page(cursor, msg["limit"])
+
+        snapshots = [
+            {
+                "created_at": created_at,
+                "url": GALLERY_URL.format(msg['entity_id'], os.path.basename(path), camera.access_tokens[-1]),
+            }
+            for created_at, path in page
+        ]
+
+        connection.send_message(
+            websocket_api.result_message(
+                msg["id"],
+                {
+                    "snapshots": snapshots,
+                    "cursor": next_cursor.isoformat() if next_cursor else None,
+                },
+            )
+        )
+    except (HomeAssistantError, ValueError) as error:
+        connection.send_message(
+            websocket_api.error_message(
+                msg["id"],
+                "snapshots_ws",
+                "Unable to fetch snapshots ({})".format(str(error)),
+            )
+        )
+        LOGGER.warning("{} snapshots websocket failed".format(msg["entity_id"]))
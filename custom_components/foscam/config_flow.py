@@ -16,14 +16,37 @@ from homeassistant.const import (
     CONF_USERNAME,
 )
 from homeassistant.data_entry_flow import AbortFlow
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 
-from .const import CONF_RTSP_PORT, CONF_STREAM, DOMAIN, LOGGER
-
-STREAMS = ["Main", "Sub"]
+from .const import CONF_RTSP_PORT, CONF_STREAM, DOMAIN, LOGGER, STREAMS
+from .discovery import async_discover, subnet_hosts
 
 DEFAULT_PORT = 88
 DEFAULT_RTSP_PORT = 554
+DEFAULT_SUBNET = "192.168.1.0/24"
+
+CONF_METHOD = "method"
+CONF_SUBNET = "subnet"
+CONF_CAMERAS = "cameras"
+
+METHOD_MANUAL = "manual"
+METHOD_DISCOVER = "discover"
+
+METHOD_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_METHOD, default=METHOD_MANUAL): vol.In([METHOD_MANUAL, METHOD_DISCOVER]),
+    }
+)
 
+DISCOVER_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_SUBNET, default=DEFAULT_SUBNET): str,
+        vol.Required(CONF_PORT, default=DEFAULT_PORT): int,
+        vol.Required(CONF_USERNAME): str,
+        vol.Required(CONF_PASSWORD): str,
+    }
+)
 
 DATA_SCHEMA = vol.Schema(
     {
@@ -42,6 +65,11 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
     VERSION = 2
 
+    def __init__(self):
+        """Initialize the flow."""
+        self._discovery = None
+        self._discovered = {}
+
     async def _validate_and_create(self, data):
         """Validate the user input allows us to connect.
 
@@ -93,7 +121,118 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         return self.async_create_entry(title=name, data=data)
 
     async def async_step_user(self, user_input=None):
-        """Handle the initial step."""
+        """Ask whether to enter a camera by hand or search for them."""
+        if user_input is not None:
+            if user_input[CONF_METHOD] == METHOD_DISCOVER:
+                return await self.async_step_discover()
+            return await self.async_step_manual()
+
+        return self.async_show_form(step_id="user", data_schema=METHOD_SCHEMA)
+
+    async def async_step_discover(self, user_input=None):
+        """Search a subnet for cameras."""
+        errors = {}
+
+        if user_input is not None:
+            try:
+                hosts = subnet_hosts(user_input[CONF_SUBNET])
+            except ValueError:
+                errors["base"] = "invalid_subnet"
+            else:
+                configured = {
+                    (entry.data[CONF_HOST], entry.data[CONF_PORT])
+                    for entry in self.hass.config_entries.async_entries(DOMAIN)
+                }
+                cameras = await async_discover(
+                    async_get_clientsession(self.hass),
+                    hosts,
+                    user_input[CONF_PORT],
+                    user_input[CONF_USERNAME],
+                    user_input[CONF_PASSWORD],
+                )
+                self._discovered = {
+                    camera.host: camera
+                    for camera in cameras
+                    if (camera.host, camera.port) not in configured
+                }
+                if self._discovered:
+                    self._discovery = user_input
+                    return await self.async_step_pick()
+                errors["base"] = "no_devices_found"
+
+        return self.async_show_form(
+            step_id="discover", data_schema=DISCOVER_SCHEMA, errors=errors
+        )
+
+    async def async_step_pick(self, user_input=None):
+        """Pick which of the discovered cameras to add."""
+        errors = {}
+
+        if user_input is not None and user_input[CONF_CAMERAS]:
+            first, *rest = user_input[CONF_CAMERAS]
+            try:
+                result = await self._validate_and_create(self._discovered_data(first, user_input))
+
+            except CannotConnect:
+                errors["base"] = "cannot_connect"
+
+            except InvalidAuth:
+                errors["base"] = "invalid_auth"
+
+            except InvalidResponse:
+                errors["base"] = "invalid_response"
+
+            except AbortFlow:
+                raise
+
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("Unexpected exception")
+                errors["base"] = "unknown"
+
+            else:
+                # The credentials work, add the rest in their own flows.
+                for host in rest:
+                    self.hass.async_create_task(
+                        self.hass.config_entries.flow.async_init(
+                            DOMAIN,
+                            context={"source": config_entries.SOURCE_IMPORT},
+                            data=self._discovered_data(host, user_input),
+                        )
+                    )
+                return result
+
+        elif user_input is not None:
+            errors["base"] = "no_cameras_selected"
+
+        cameras = {
+            host: f"{camera.name} ({host})" for host, camera in sorted(self._discovered.items())
+        }
+        return self.async_show_form(
+            step_id="pick",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(CONF_CAMERAS, default=list(cameras)): cv.multi_select(cameras),
+                    vol.Required(CONF_STREAM, default=STREAMS[0]): vol.In(STREAMS),
+                    vol.Required(CONF_RTSP_PORT, default=DEFAULT_RTSP_PORT): int,
+                }
+            ),
+            errors=errors,
+        )
+
+    def _discovered_data(self, host, user_input):
+        camera = self._discovered[host]
+        return {
+            CONF_NAME: camera.name,
+            CONF_HOST: camera.host,
+            CONF_PORT: camera.port,
+            CONF_USERNAME: self._discovery[CONF_USERNAME],
+            CONF_PASSWORD: self._discovery[CONF_PASSWORD],
+            CONF_STREAM: user_input[CONF_STREAM],
+            CONF_RTSP_PORT: user_input[CONF_RTSP_PORT],
+        }
+
+    async def async_step_manual(self, user_input=None):
+        """Handle entering a camera by hand."""
         errors = {}
 
         if user_input is not None:
@@ -117,7 +256,7 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 errors["base"] = "unknown"
 
         return self.async_show_form(
-            step_id="user", data_schema=DATA_SCHEMA, errors=errors
+            step_id="manual", data_schema=DATA_SCHEMA, errors=errors
         )
 
     async def async_step_import(self, import_config):
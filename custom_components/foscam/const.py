@@ -7,6 +7,30 @@ DOMAIN = "foscam"
 
 CONF_RTSP_PORT = "rtsp_port"
 CONF_STREAM = "stream"
+CONF_IO_WORKERS = "io_workers"
+CONF_TRANSCODE_WORKERS = "transcode_workers"
+CONF_DOWNLOAD_RATE = "download_rate"
+CONF_FRAME_GRABBER = "frame_grabber"
+CONF_FRAME_GRABBER_IDLE = "frame_grabber_idle"
+CONF_MEDIA_GLOBAL_LIMIT = "media_global_limit"
+CONF_MEDIA_CAMERA_LIMIT = "media_camera_limit"
+CONF_MEDIA_QUEUE_TIMEOUT = "media_queue_timeout"
+
+DEFAULT_IO_WORKERS = 4
+DEFAULT_TRANSCODE_WORKERS = 1
+DEFAULT_DOWNLOAD_RATE = 0
+DEFAULT_FRAME_GRABBER_IDLE = 60
+DEFAULT_MEDIA_GLOBAL_LIMIT = 16
+DEFAULT_MEDIA_CAMERA_LIMIT = 4
+DEFAULT_MEDIA_QUEUE_TIMEOUT = 5
+
+DATA_CONFIG = "foscam_config"
+DATA_EXECUTORS = "foscam_executors"
+DATA_LIMITER = "foscam_limiter"
+
+STREAMS = ["Main", "Sub"]
 
 SERVICE_PTZ = "ptz"
 SERVICE_PTZ_PRESET = "ptz_preset"
+SERVICE_PTZ_PATH = "ptz_path"
+SERVICE_PROFILE = "profile"
@@ -0,0 +1,112 @@
+"""Find Foscam cameras on the local network."""
+import asyncio
+import ipaddress
+import xml.etree.ElementTree as ElementTree
+
+import aiohttp
+import async_timeout
+
+from .const import (
+    LOGGER
+)
+
+DISCOVERY_CONCURRENCY = 64
+DISCOVERY_TIMEOUT = 2.0
+
+# Don't let a typo turn into a scan of a huge network.
+MIN_PREFIX_LENGTH = 22
+
+CGI_PATH = "/cgi-bin/CGIProxy.fcgi"
+
+# Foscam CGI result codes that still mean "this is a Foscam".
+RESULT_SUCCESS = "0"
+RESULT_AUTH = "-2"
+
+
+class DiscoveredCamera:
+    """A camera that answered a discovery probe."""
+
+    def __init__(self, host, port, name, mac, authenticated):
+        self.host = host
+        self.port = port
+        self.name = name
+        self.mac = mac
+        self.authenticated = authenticated
+
+    def __repr__(self):
+        return f"DiscoveredCamera({self.host}:{self.port},{self.name})"
+
+
+def subnet_hosts(subnet):
+    """Return the hosts in `subnet`, raises ValueError if it is bad or too big."""
+    network = ipaddress.ip_network(subnet, strict=False)
+    if network.version != 4 or network.prefixlen < MIN_PREFIX_LENGTH:
+        raise ValueError(f"subnet {subnet} is too large")
+    return [str(host) for host in network.hosts()] or [str(network.network_address)]
+
+
+def parse_dev_info(text):
+    """Parse a getDevInfo reply, returns None if it isn't a Foscam CGI result."""
+    try:
+        root = ElementTree.fromstring(text)
+    except ElementTree.ParseError:
+        return None
+    if root.tag != "CGI_Result":
+        return None
+    return {child.tag: (child.text or "") for child in root}
+
+
+async def async_probe(session, host, port, username=None, password=None, timeout=DISCOVERY_TIMEOUT):
+    """Ask `host` for its device info, returns a DiscoveredCamera or None.
+
+    Without credentials a Foscam still answers, with an auth error, which is
+    enough to know it's a camera.
+    """
+    params = {"cmd": "getDevInfo"}
+    if username is not None:
+        params.update({"usr": username, "pwd": password})
+    try:
+        async with async_timeout.timeout(timeout):
+            async with session.get(f"http://{host}:{port}{CGI_PATH}", params=params) as response:
+                if response.status != 200:
+                    return None
+                text = await response.text()
+    except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeDecodeError):
+        return None
+
+    info = parse_dev_info(text)
+    if info is None:
+        return None
+    result = info.get("result")
+    if result not in (RESULT_SUCCESS, RESULT_AUTH):
+        return None
+
+    name = info.get("devName") or f"Foscam {host}:{port}"
+    return DiscoveredCamera(host, port, name, info.get("mac"), result == RESULT_SUCCESS)
+
+
+async def async_discover(session, hosts, port, username, password,
+                         concurrency=DISCOVERY_CONCURRENCY, timeout=DISCOVERY_TIMEOUT):
+    """Probe `hosts` concurrently and return the cameras that answered.
+
+    At most `concurrency` probes are in flight and each one gives up after
+    `timeout` seconds, so a /24 takes a few seconds whatever is on it.
+
+    The sweep goes out without credentials, they are only sent to hosts that
+    answered like a Foscam, to read their names.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _probe(host, *credentials):
+        async with semaphore:
+            return await async_probe(session, host, port, *credentials, timeout=timeout)
+
+    async def _name(camera):
+        if camera.authenticated:
+            return camera
+        return await _probe(camera.host, username, password) or camera
+
+    results = await asyncio.gather(*[_probe(host) for host in hosts])
+    cameras = await asyncio.gather(*[_name(camera) for camera in results if camera is not None])
+    LOGGER.debug(f"discovery found {cameras}")
+    return cameras
@@ -0,0 +1,60 @@
+"""Resumable, rate limited FTP downloads."""
+import os
+import time
+
+from .const import (
+    LOGGER
+)
+
+BLOCK_SIZE = 32 * 1024
+
+
+class Throttle:
+    """Keep a transfer under `rate` bytes per second, 0 means no limit."""
+
+    def __init__(self, rate):
+        self._rate = rate
+        self._start = time.monotonic()
+        self._bytes = 0
+
+    def update(self, count):
+        if not self._rate:
+            return
+        self._bytes += count
+        ahead = self._bytes / self._rate - (time.monotonic() - self._start)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+def download(ftp, remote, local, size, rate=0):
+    """Download `remote` to `local`, picking up where a previous try stopped.
+
+    Data goes to `local`.part and is only renamed once it matches the listed
+    remote `size`. A dropped connection leaves the partial file in place and
+    the next call asks the server to restart from its end with REST. Returns
+    True when `local` is complete.
+    """
+    partial = f"{local}.part"
+    offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+    if offset > size:
+        LOGGER.debug(f"{partial} bigger than remote, restarting")
+        offset = 0
+    if offset < size:
+        LOGGER.debug(f"downloading {remote} from {offset}/{size}")
+        throttle = Throttle(rate)
+        with open(partial, "ab" if offset else "wb") as file:
+            def _write(block):
+                file.write(block)
+                throttle.update(len(block))
+
+            ftp.conn.retrbinary(f"RETR {remote}", _write, blocksize=BLOCK_SIZE, rest=offset or None)
+
+    got = os.path.getsize(partial)
+    if got != size:
+        LOGGER.warning(f"download of {remote} incomplete, {got} of {size} bytes")
+        if got > size:
+            os.unlink(partial)
+        return False
+
+    os.replace(partial, local)
+    return True
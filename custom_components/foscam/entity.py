@@ -0,0 +1,38 @@
+"""Base entity for Foscam coordinator entities."""
+from homeassistant.core import callback
+from homeassistant.helpers.update_coordinator import (
+    CoordinatorEntity,
+)
+
+from .updater import (
+    BREAKER_CLOSED,
+)
+
+
+class FoscamCoordinatorEntity(CoordinatorEntity):
+    """A coordinator entity that only writes state when its values change.
+
+    Entities list the coordinator keys they depend on in `_watched` and the
+    updater publishes which keys changed on each refresh.
+    """
+
+    _watched = ()
+
+    def __init__(self, coordinator):
+        super().__init__(coordinator)
+        self._was_available = None
+
+    @property
+    def available(self):
+        """Return False while the camera's circuit breaker is not closed."""
+        if not super().available or self.coordinator.data is None:
+            return False
+        return self.coordinator.data["connection"] == BREAKER_CLOSED
+
+    @callback
+    def _handle_coordinator_update(self):
+        available = self.available
+        if available == self._was_available and not self.coordinator.changed.intersection(self._watched):
+            return
+        self._was_available = available
+        self.async_write_ha_state()
@@ -0,0 +1,59 @@
+"""Bounded executors for slow Foscam work."""
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+
+from .const import (
+    DATA_EXECUTORS,
+    DEFAULT_IO_WORKERS,
+    DEFAULT_TRANSCODE_WORKERS,
+    LOGGER,
+)
+
+
+class FoscamExecutors:
+    """Thread pools for camera I/O and transcoding.
+
+    FTP crawls, downloads and ffmpeg runs can take minutes so they are kept
+    off Home Assistant's shared executor. Each pool is bounded, a backlog on
+    one camera queues here rather than starving other integrations.
+    Device state polling is quick and mustn't wait behind them, it stays on
+    Home Assistant's executor. Daily summaries can encode for hours so they
+    get a single thread of their own rather than holding up conversions.
+    """
+
+    def __init__(self, io_workers, transcode_workers):
+        LOGGER.debug(f"executors io={io_workers},transcode={transcode_workers}")
+        self._io = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="foscam_io")
+        self._transcode = ThreadPoolExecutor(max_workers=transcode_workers, thread_name_prefix="foscam_transcode")
+        self._transcode_workers = transcode_workers
+        self._summary = ThreadPoolExecutor(max_workers=1, thread_name_prefix="foscam_summary")
+
+    @property
+    def transcode_workers(self):
+        return self._transcode_workers
+
+    async def async_run_io(self, hass, target, *args):
+        return await hass.loop.run_in_executor(self._io, partial(target, *args))
+
+    async def async_run_transcode(self, hass, target, *args):
+        return await hass.loop.run_in_executor(self._transcode, partial(target, *args))
+
+    async def async_run_summary(self, hass, target, *args):
+        return await hass.loop.run_in_executor(self._summary, partial(target, *args))
+
+    def shutdown(self):
+        self._io.shutdown(wait=False)
+        self._transcode.shutdown(wait=False)
+        self._summary.shutdown(wait=False)
+
+
+def get_executors(hass, io_workers=DEFAULT_IO_WORKERS, transcode_workers=DEFAULT_TRANSCODE_WORKERS):
+    """Return the shared executors, creating them on first use."""
+    executors = hass.data.get(DATA_EXECUTORS)
+    if executors is None:
+        executors = FoscamExecutors(io_workers, transcode_workers)
+        hass.data[DATA_EXECUTORS] = executors
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, lambda _event: executors.shutdown())
+    return executors
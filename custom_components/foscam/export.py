@@ -0,0 +1,58 @@
+"""Stream recordings out as a tar archive."""
+import os
+import tarfile
+
+from .const import (
+    LOGGER
+)
+
+CHUNK_SIZE = 256 * 1024
+BLOCK_SIZE = tarfile.BLOCKSIZE
+
+
+def _open(path):
+    try:
+        file = open(path, mode="rb")
+    except OSError:
+        return None, None
+    stat = os.fstat(file.fileno())
+    return file, stat
+
+
+async def async_write_file(hass, response, path, arcname):
+    """Write one tar member to `response`, reading a chunk at a time."""
+    file, stat = await hass.async_add_executor_job(_open, path)
+    if file is None:
+        LOGGER.debug(f"export skipping {path}")
+        return False
+
+    try:
+        info = tarfile.TarInfo(arcname)
+        info.size = stat.st_size
+        info.mtime = int(stat.st_mtime)
+        await response.write(info.tobuf(format=tarfile.GNU_FORMAT))
+
+        remaining = stat.st_size
+        while remaining > 0:
+            chunk = await hass.async_add_executor_job(file.read, min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            await response.write(chunk)
+
+        # Keep the archive consistent if the file shrank under us.
+        while remaining > 0:
+            padding = min(CHUNK_SIZE, remaining)
+            remaining -= padding
+            await response.write(bytes(padding))
+
+        if stat.st_size % BLOCK_SIZE:
+            await response.write(bytes(BLOCK_SIZE - stat.st_size % BLOCK_SIZE))
+    finally:
+        await hass.async_add_executor_job(file.close)
+    return True
+
+
+async def async_write_end(response):
+    """Finish the archive."""
+    await response.write(bytes(2 * BLOCK_SIZE))
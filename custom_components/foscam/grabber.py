@@ -0,0 +1,116 @@
+"""Keep the latest keyframe of an RTSP stream in memory."""
+import subprocess
+import threading
+import time
+
+from .const import (
+    LOGGER
+)
+
+READ_SIZE = 64 * 1024
+JPEG_START = b"\xff\xd8"
+JPEG_END = b"\xff\xd9"
+
+# Don't let a broken stream grow the buffer forever.
+MAX_BUFFER = 4 * 1024 * 1024
+
+# Frames older than this aren't served, the caller falls back to a snapshot.
+MAX_FRAME_AGE = 10
+# How often the watchdog checks for an idle or stalled stream.
+WATCHDOG_INTERVAL = 5
+# RTSP socket timeout handed to ffmpeg, in microseconds.
+SOCKET_TIMEOUT = 5 * 1000000
+
+
+class FrameGrabber:
+    """Decode the keyframes of a stream with ffmpeg and keep the last one.
+
+    The grabber starts on the first request and shuts ffmpeg down once no
+    one has asked for a frame for `idle_timeout` seconds. A watchdog thread
+    does the shutting down, and also kills ffmpeg if the stream stalls, the
+    reader can block forever waiting on a dead stream.
+    """
+
+    def __init__(self, name, url, idle_timeout):
+        self._name = name
+        self._url = url
+        self._idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._process = None
+        self._frame = None
+        self._frame_at = 0.0
+        self._last_request = 0.0
+
+    def get(self):
+        """Return the latest frame, None if there isn't a recent one."""
+        with self._lock:
+            self._last_request = time.monotonic()
+            if self._process is None:
+                self._start()
+            if self._last_request - self._frame_at > MAX_FRAME_AGE:
+                return None
+            return self._frame
+
+    def stop(self):
+        with self._lock:
+            process, self._process = self._process, None
+            self._frame = None
+        if process is not None:
+            LOGGER.debug(f"stopping grabber for {self._name}")
+            process.kill()
+            process.wait()
+
+    def _start(self):
+        LOGGER.debug(f"starting grabber for {self._name}")
+        self._process = subprocess.Popen(["ffmpeg", "-v", "error", "-rtsp_transport", "tcp",
+                                          "-timeout", str(SOCKET_TIMEOUT),
+                                          "-skip_frame", "nokey", "-i", self._url,
+                                          "-vsync", "0", "-f", "image2pipe", "-vcodec", "mjpeg", "-"],
+                                         stdin=subprocess.DEVNULL,
+                                         stdout=subprocess.PIPE,
+                                         stderr=subprocess.DEVNULL)
+        self._frame_at = time.monotonic()
+        threading.Thread(target=self._read, args=(self._process,),
+                         name=f"foscam_grabber_{self._name}", daemon=True).start()
+        threading.Thread(target=self._watchdog, args=(self._process,),
+                         name=f"foscam_grabber_watchdog_{self._name}", daemon=True).start()
+
+    def _watchdog(self, process):
+        """Kill ffmpeg when no one wants frames or none are coming, the reader then exits."""
+        while process.poll() is None:
+            time.sleep(WATCHDOG_INTERVAL)
+            now = time.monotonic()
+            if now - self._last_request > self._idle_timeout:
+                LOGGER.debug(f"grabber for {self._name} idle")
+                break
+            if now - self._frame_at > MAX_FRAME_AGE:
+                LOGGER.debug(f"grabber for {self._name} stalled")
+                break
+        process.kill()
+
+    def _read(self, process):
+        buffer = b""
+        while True:
+            data = process.stdout.read1(READ_SIZE)
+            if not data:
+                LOGGER.debug(f"grabber for {self._name} stream ended")
+                break
+            buffer += data
+
+            # keep the newest complete jpeg
+            end = buffer.rfind(JPEG_END)
+            if end >= 0:
+                start = buffer.rfind(JPEG_START, 0, end)
+                if start >= 0:
+                    self._frame = buffer[start:end + 2]
+                    self._frame_at = time.monotonic()
+                buffer = buffer[end + 2:]
+            if len(buffer) > MAX_BUFFER:
+                buffer = b""
+
+        with self._lock:
+            if self._process is process:
+                self._process = None
+                self._frame = None
+        process.kill()
+        process.wait()
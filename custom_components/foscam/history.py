@@ -0,0 +1,62 @@
+"""A fixed size history of camera state transitions."""
+from array import array
+
+# What the history records, values are stored as an index into VALUES.
+FIELDS = ["state", "motion", "sound", "io"]
+VALUES = ["unknown", "idle", "motion", "recording", "recently active", False, True]
+
+DEFAULT_CAPACITY = 2048
+
+
+class TransitionHistory:
+    """A ring buffer of timestamped transitions.
+
+    Entries live in three parallel arrays, a double for the time and a byte
+    each for the field and the value, so a couple of thousand transitions per
+    camera costs a few tens of kilobytes. When full the oldest entries are
+    overwritten.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self._capacity = capacity
+        self._times = array("d", bytes(8 * capacity))
+        self._fields = array("B", bytes(capacity))
+        self._values = array("B", bytes(capacity))
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def record(self, at, field, value):
+        """Add a transition, `at` is a unix timestamp."""
+        i = self._next
+        self._times[i] = at
+        self._fields[i] = FIELDS.index(field)
+        self._values[i] = VALUES.index(value) if value in VALUES else 0
+        self._next = (i + 1) % self._capacity
+        self._count = min(self._count + 1, self._capacity)
+
+    def _slot(self, n):
+        """Map the n'th oldest entry to its slot."""
+        return (self._next - self._count + n) % self._capacity
+
+    def _bisect(self, at):
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._times[self._slot(mid)] < at:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def query(self, start=None, end=None):
+        """Return (time, field, value) tuples between `start` and `end`, oldest first."""
+        first = 0 if start is None else self._bisect(start)
+        last = self._count if end is None else self._bisect(end)
+        events = []
+        for n in range(first, last):
+            i = self._slot(n)
+            events.append((self._times[i], FIELDS[self._fields[i]], VALUES[self._values[i]]))
+        return events
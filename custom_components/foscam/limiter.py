@@ -0,0 +1,84 @@
+"""Concurrency limits for the media views."""
+import asyncio
+from contextlib import asynccontextmanager
+
+from .const import (
+    DATA_LIMITER,
+    DEFAULT_MEDIA_CAMERA_LIMIT,
+    DEFAULT_MEDIA_GLOBAL_LIMIT,
+    DEFAULT_MEDIA_QUEUE_TIMEOUT,
+)
+
+
+class Shed(Exception):
+    """A request waited too long for a slot."""
+
+
+class MediaLimiter:
+    """Cap how many media requests run at once, per camera and overall.
+
+    Requests over the limit queue for up to `queue_timeout` seconds and are
+    then shed, the view turns that into a 503 with Retry-After. Counters are
+    kept overall and per camera.
+    """
+
+    def __init__(self, global_limit, camera_limit, queue_timeout):
+        self._global = asyncio.Semaphore(global_limit)
+        self._camera_limit = camera_limit
+        self._cameras = {}
+        self._queue_timeout = queue_timeout
+        self._stats = {}
+
+    @property
+    def retry_after(self):
+        return max(int(self._queue_timeout), 1)
+
+    def stats(self, key=None):
+        """Return served, queued and shed counts for a camera or, with no key, overall."""
+        return dict(self._stats.setdefault(key, {"served": 0, "queued": 0, "shed": 0}))
+
+    def _count(self, key, what):
+        for k in (key, None):
+            self._stats.setdefault(k, {"served": 0, "queued": 0, "shed": 0})[what] += 1
+
+    async def _acquire(self, key, semaphore, timeout):
+        if not semaphore.locked():
+            await semaphore.acquire()
+            return
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self._count(key, "shed")
+            raise Shed()
+
+    @asynccontextmanager
+    async def slot(self, key):
+        camera = self._cameras.get(key)
+        if camera is None:
+            camera = self._cameras[key] = asyncio.Semaphore(self._camera_limit)
+        if camera.locked() or self._global.locked():
+            self._count(key, "queued")
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._queue_timeout
+        await self._acquire(key, camera, self._queue_timeout)
+        try:
+            await self._acquire(key, self._global, max(deadline - loop.time(), 0.001))
+            try:
+                yield
+            finally:
+                # errors count too, they still held a slot
+                self._count(key, "served")
+                self._global.release()
+        finally:
+            camera.release()
+
+
+def get_limiter(hass, global_limit=DEFAULT_MEDIA_GLOBAL_LIMIT, camera_limit=DEFAULT_MEDIA_CAMERA_LIMIT,
+                queue_timeout=DEFAULT_MEDIA_QUEUE_TIMEOUT):
+    """Return the shared limiter, creating it on first use."""
+    limiter = hass.data.get(DATA_LIMITER)
+    if limiter is None:
+        limiter = MediaLimiter(global_limit, camera_limit, queue_timeout)
+        hass.data[DATA_LIMITER] = limiter
+    return limiter
@@ -10,18 +10,22 @@ class Recording:
 
     _last_duration = None
 
-    def __init__(self, date, recording, snapshot, size):
+    def __init__(self, date, recording, snapshot, size, mtime=None, listed_at=None):
         self._date = date
         self._remote_recording = recording
         self._remote_snapshot = snapshot
         self._remote_size = size
+        self._remote_mtime = mtime
+        self._listed_at = listed_at
+        # size at the listing before, None until it's been listed twice
+        self._previous_size = None
 
         base = os.path.splitext(os.path.basename(recording))[0]
         self._recording = f"foscam/{base}.mp4"
+        self._download = f"foscam/{base}.avi"
         self._snapshot = f"foscam/{base}.jpg"
 
         self._duration = None
-        LOGGER.debug(f"Recording({self._recording})")
 
     @property
     def created_at(self):
@@ -42,6 +46,11 @@ class Recording:
     def content_url(self):
         return self._recording
 
+    @property
+    def download_url(self):
+        """Where the raw recording goes before it's converted."""
+        return self._download
+
     @property
     def duration(self):
         if self._duration is None:
@@ -91,8 +100,27 @@ class Recording:
     def remote_size(self):
         return self._remote_size
 
-    def update_remote_size(self, size):
+    @property
+    def remote_mtime(self):
+        return self._remote_mtime
+
+    @property
+    def listed_at(self):
+        """When size and mtime were read from the camera."""
+        return self._listed_at
+
+    @property
+    def size_settled(self):
+        """True if the size didn't change between the last two listings."""
+        return self._previous_size is not None and self._previous_size == self._remote_size
+
+    def update_remote(self, size, mtime, listed_at, snapshot=None):
+        self._previous_size = self._remote_size
         self._remote_size = size
+        self._remote_mtime = mtime
+        self._listed_at = listed_at
+        if snapshot:
+            self._remote_snapshot = snapshot
 
     @property
     def image_source(self):
@@ -0,0 +1,81 @@
+"""On demand profiling of the updater and views."""
+import cProfile
+import io
+import os
+import pstats
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from .const import (
+    LOGGER
+)
+
+PROFILE_TOP = 25
+
+
+class Profiler:
+    """Profile the next few runs of a piece of code.
+
+    Wrap the code in `cycle()`, it costs nothing until `start()` is called.
+    Once the requested number of cycles have run the stats are written under
+    the config directory and the top entries are logged.
+
+    cProfile only sees the thread that enabled it, so wrap the blocking work
+    running in an executor, not a coroutine on the event loop.
+    """
+
+    def __init__(self, hass, name):
+        self._hass = hass
+        self._name = name
+        self._lock = threading.Lock()
+        self._profile = None
+        self._remaining = 0
+        self._active = False
+
+    def start(self, cycles):
+        with self._lock:
+            if self._profile is None:
+                self._profile = cProfile.Profile()
+            self._remaining = cycles
+        LOGGER.warning(f"profiling {cycles} cycles of {self._name}")
+
+    @contextmanager
+    def cycle(self):
+        if self._remaining <= 0:
+            yield
+            return
+
+        # One thread at a time, a profile is enabled and disabled per thread.
+        with self._lock:
+            profile = None
+            if not self._active and self._remaining > 0:
+                profile = self._profile
+                self._active = True
+        if profile is None:
+            yield
+            return
+
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._lock:
+                self._active = False
+                self._remaining -= 1
+                done = self._remaining <= 0
+                if done:
+                    self._profile = None
+            if done:
+                self._hass.add_job(self._hass.async_add_executor_job, self._dump, profile)
+
+    def _dump(self, profile):
+        directory = self._hass.config.path("foscam")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"profile_{self._name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prof")
+        profile.dump_stats(path)
+
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        LOGGER.warning(f"profile of {self._name} written to {path}\n{out.getvalue()}")
@@ -0,0 +1,152 @@
+"""Serialised PTZ commands for a Foscam camera."""
+import asyncio
+from collections import deque
+
+from .const import (
+    LOGGER
+)
+
+MOVEMENT_ATTRS = {
+    "up": "ptz_move_up",
+    "down": "ptz_move_down",
+    "left": "ptz_move_left",
+    "right": "ptz_move_right",
+    "top_left": "ptz_move_top_left",
+    "top_right": "ptz_move_top_right",
+    "bottom_left": "ptz_move_bottom_left",
+    "bottom_right": "ptz_move_bottom_right",
+}
+
+# Upper bound for a coalesced move, stops a stuck joystick driving forever.
+MAX_TRAVEL_TIME = 5.0
+
+CMD_MOVE = "move"
+CMD_PRESET = "preset"
+CMD_PATH = "path"
+
+
+class PtzQueue:
+    """A per camera PTZ command queue.
+
+    Commands are run one at a time by a single task on the event loop. A move
+    arriving while a move in the same direction is pending or running extends
+    that move rather than stopping and starting the motor again. Timing is
+    taken from the loop clock so executor delays don't stretch the moves.
+    """
+
+    def __init__(self, hass, camera, name):
+        self._hass = hass
+        self._camera = camera
+        self._name = name
+        self._pending = deque()
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def _start(self):
+        if self._task is None or self._task.done():
+            self._task = self._hass.async_create_task(self._async_run())
+
+    def stop(self):
+        """Drop anything queued and stop the worker."""
+        self._pending.clear()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def move(self, movement, travel_time):
+        """Queue a move, merging it with a queued move in the same direction."""
+        if self._pending and self._pending[-1][0] == CMD_MOVE and self._pending[-1][1] == movement:
+            last = self._pending.pop()
+            travel_time = min(last[2] + travel_time, MAX_TRAVEL_TIME)
+        self._queue((CMD_MOVE, movement, travel_time))
+
+    def preset(self, preset_name):
+        """Queue a move to a preset."""
+        self._queue((CMD_PRESET, preset_name))
+
+    def path(self, steps):
+        """Queue a sequence of moves and presets to play back in one go."""
+        self._queue((CMD_PATH, steps))
+
+    def _queue(self, command):
+        self._pending.append(command)
+        self._wakeup.set()
+        self._start()
+
+    async def _async_run(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            command = self._pending.popleft()
+            try:
+                if command[0] == CMD_MOVE:
+                    await self._async_move(command[1], command[2], coalesce=True)
+                elif command[0] == CMD_PRESET:
+                    await self._async_preset(command[1])
+                else:
+                    await self._async_path(command[1])
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("PTZ command %s failed on '%s'", command[0], self._name)
+
+    async def _async_call(self, attr, *args):
+        function = getattr(self._camera, attr)
+        ret, _ = await self._hass.async_add_executor_job(function, *args)
+        return ret
+
+    async def _async_move(self, movement, travel_time, coalesce=False):
+        LOGGER.debug("PTZ action '%s' on %s", movement, self._name)
+        loop = asyncio.get_running_loop()
+
+        ret = await self._async_call(MOVEMENT_ATTRS[movement])
+        if ret != 0:
+            LOGGER.error("Error moving %s '%s': %s", movement, self._name, ret)
+            return
+
+        # Keep the motor running while the joystick keeps asking for the same
+        # direction.
+        deadline = loop.time() + travel_time
+        limit = loop.time() + MAX_TRAVEL_TIME
+        while True:
+            await asyncio.sleep(max(deadline - loop.time(), 0))
+            if not coalesce or not self._pending:
+                break
+            following = self._pending[0]
+            if following[0] != CMD_MOVE or following[1] != movement:
+                break
+            self._pending.popleft()
+            deadline = min(deadline + following[2], limit)
+
+        ret = await self._async_call("ptz_stop_run")
+        if ret != 0:
+            LOGGER.error("Error stopping movement on '%s': %s", self._name, ret)
+
+    async def _async_preset(self, preset_name):
+        LOGGER.debug("PTZ preset '%s' on %s", preset_name, self._name)
+        ret = await self._async_call("ptz_goto_preset", preset_name)
+        if ret != 0:
+            LOGGER.error(
+                "Error moving to preset %s on '%s': %s", preset_name, self._name, ret
+            )
+
+    async def _async_path(self, steps):
+        """Play back a path.
+
+        Each step starts at a fixed offset from the start of the path so
+        delays in one step don't push the rest of the path back.
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        offset = 0.0
+        for step in steps:
+            await asyncio.sleep(max(start + offset - loop.time(), 0))
+            if "movement" in step:
+                await self._async_move(step["movement"], step["travel_time"])
+                offset += step["travel_time"]
+            else:
+                await self._async_preset(step["preset_name"])
+            offset += step.get("wait", 0)
@@ -1,13 +1,16 @@
 
 from homeassistant.helpers.entity import Entity
-from homeassistant.helpers.update_coordinator import (
-    CoordinatorEntity,
-)
 
 from .const import (
     DOMAIN,
     LOGGER,
 )
+from .entity import (
+    FoscamCoordinatorEntity,
+)
+from .limiter import (
+    get_limiter,
+)
 
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
@@ -18,20 +21,24 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
     entries = [
             HassFoscamSensor(data, config_entry, "last", "mdi:fast-run"),
             HassFoscamSensor(data, config_entry, "captured_today", "mdi:file-video"),
-            HassFoscamSensor(data, config_entry, "captured_total", "mdi:file-video")
+            HassFoscamSensor(data, config_entry, "captured_total", "mdi:file-video",
+                             ("library", "library_updated_at", "library_source", "library_crawl_seconds")),
+            HassFoscamMediaSensor(hass, config_entry),
     ]
     async_add_entities(entries)
 
 
-class HassFoscamSensor(CoordinatorEntity, Entity):
+class HassFoscamSensor(FoscamCoordinatorEntity, Entity):
     """An implementation of a Foscam IP camera."""
 
-    def __init__(self, data, config_entry, state_name, icon):
-        super().__init__(data["coordinator"])
+    def __init__(self, data, config_entry, state_name, icon, attributes=()):
+        super().__init__(data["recordings"])
 
         self._name = f"{state_name} {config_entry.title}"
         self._unique_id = f"{state_name}_{config_entry.entry_id}"
         self._state_name = state_name
+        self._attributes = attributes
+        self._watched = (state_name, *attributes)
         self._icon = icon
         LOGGER.info(f"starting {self._name}")
 
@@ -40,6 +47,11 @@ class HassFoscamSensor(CoordinatorEntity, Entity):
         """Return the state of the sensor."""
         return self.coordinator.data[self._state_name]
 
+    @property
+    def extra_state_attributes(self):
+        """Return the state attributes."""
+        return {name: self.coordinator.data[name] for name in self._attributes}
+
     @property
     def icon(self):
         """Icon to use in the frontend, if any."""
@@ -54,3 +66,51 @@ class HassFoscamSensor(CoordinatorEntity, Entity):
     def name(self):
         """Return the name of this camera binary sensor."""
         return self._name
+
+
+class HassFoscamMediaSensor(Entity):
+    """Counts of media requests served, queued and shed for a camera."""
+
+    def __init__(self, hass, config_entry):
+        self._limiter = get_limiter(hass)
+        self._entry_id = config_entry.entry_id
+        self._name = f"media requests {config_entry.title}"
+        self._unique_id = f"media_requests_{config_entry.entry_id}"
+        self._stats = self._limiter.stats(self._entry_id)
+        LOGGER.info(f"starting {self._name}")
+
+    def update(self):
+        """Read the limiter's counters."""
+        self._stats = self._limiter.stats(self._entry_id)
+
+    @property
+    def state(self):
+        """Return the number of requests served."""
+        return self._stats["served"]
+
+    @property
+    def extra_state_attributes(self):
+        """Return the state attributes."""
+        totals = self._limiter.stats()
+        return {
+            "queued": self._stats["queued"],
+            "shed": self._stats["shed"],
+            "total_served": totals["served"],
+            "total_queued": totals["queued"],
+            "total_shed": totals["shed"],
+        }
+
+    @property
+    def icon(self):
+        """Icon to use in the frontend, if any."""
+        return "mdi:speedometer"
+
+    @property
+    def unique_id(self):
+        """Return the entity unique ID."""
+        return self._unique_id
+
+    @property
+    def name(self):
+        """Return the name of this media sensor."""
+        return self._name
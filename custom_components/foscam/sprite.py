@@ -0,0 +1,60 @@
+"""Contact sheets of recording thumbnails."""
+import os
+import subprocess
+import tempfile
+
+from .const import (
+    LOGGER
+)
+
+SPRITE_COLUMNS = 8
+SPRITE_WIDTH = 160
+SPRITE_HEIGHT = 90
+
+
+def sprite_layout(recordings, start, count):
+    """Return the indices of the recordings in range that have a thumbnail.
+
+    The n'th index in the list is the n'th tile of the sheet.
+    """
+    return tuple(
+        index for index in range(start, min(start + count, len(recordings)))
+        if os.path.exists(recordings[index].thumbnail_url)
+    )
+
+
+def sprite_offsets(layout):
+    """Map recording index to the (x, y) of its tile."""
+    return {
+        index: ((n % SPRITE_COLUMNS) * SPRITE_WIDTH, (n // SPRITE_COLUMNS) * SPRITE_HEIGHT)
+        for n, index in enumerate(layout)
+    }
+
+
+def build_sprite(recordings, layout):
+    """Tile the thumbnails in `layout` into one jpeg with ffmpeg, returns the bytes."""
+    if not layout:
+        return None
+
+    columns = min(len(layout), SPRITE_COLUMNS)
+    rows = (len(layout) + SPRITE_COLUMNS - 1) // SPRITE_COLUMNS
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as listing:
+        for index in layout:
+            listing.write(f"file '{os.path.abspath(recordings[index].thumbnail_url)}'\n")
+
+    try:
+        result = subprocess.run(["ffmpeg", "-v", "error", "-f", "concat", "-safe", "0", "-i", listing.name,
+                                 "-vf", f"scale={SPRITE_WIDTH}:{SPRITE_HEIGHT}:force_original_aspect_ratio=decrease,"
+                                        f"pad={SPRITE_WIDTH}:{SPRITE_HEIGHT}:(ow-iw)/2:(oh-ih)/2,setsar=1,"
+                                        f"tile={columns}x{rows}",
+                                 "-frames:v", "1", "-f", "image2pipe", "-vcodec", "mjpeg", "-"],
+                                stdin=subprocess.DEVNULL,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+    finally:
+        os.unlink(listing.name)
+
+    if result.returncode != 0:
+        LOGGER.warning(f"failed to build sprite: {result.stderr}")
+        return None
+    return result.stdout
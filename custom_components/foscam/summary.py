@@ -0,0 +1,141 @@
+"""Fast forward summaries of each day's recordings."""
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from datetime import date, timedelta
+
+from .const import (
+    LOGGER
+)
+
+SUMMARY_DAYS = 7
+SUMMARY_SPEED = 8
+SUMMARY_DIR = "foscam"
+
+
+def _ffmpeg(args):
+    # run at the lowest priority, summaries are never urgent
+    result = subprocess.run(["nice", "-n", "19", "ffmpeg", "-v", "error", "-y"] + args,
+                            stdin=subprocess.DEVNULL,
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        LOGGER.warning(f"summary ffmpeg failed: {result.stderr}")
+    return result.returncode == 0
+
+
+def _concat(paths, out, extra):
+    """Run the concat demuxer over `paths` into `out`."""
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as listing:
+        for path in paths:
+            listing.write(f"file '{os.path.abspath(path)}'\n")
+    try:
+        return _ffmpeg(["-f", "concat", "-safe", "0", "-i", listing.name] + extra + [out])
+    finally:
+        os.unlink(listing.name)
+
+
+class DailySummaries:
+    """Per day fast forward videos made from the converted clips.
+
+    Each clip is sped up once into its own segment, the day's summary is the
+    segments joined in time order with a stream copy. Clips can arrive in any
+    order and only the new ones are encoded. A manifest lists the clips in
+    the summary and the ones that wouldn't encode, so they aren't retried.
+    Days older than SUMMARY_DAYS are deleted.
+    """
+
+    def __init__(self, name):
+        self._name = name
+
+    def _prefix(self):
+        return f"summary_{self._name}_"
+
+    def _base(self, day):
+        return os.path.join(SUMMARY_DIR, f"{self._prefix()}{day.strftime('%Y%m%d')}")
+
+    def path(self, day):
+        return f"{self._base(day)}.mp4"
+
+    def update(self, recordings, busy=()):
+        """Bring the last SUMMARY_DAYS days up to date, runs in the summary executor.
+
+        `busy` holds the clips still being downloaded or converted, they're
+        left for the next run.
+        """
+        oldest = date.today() - timedelta(days=SUMMARY_DAYS - 1)
+        days = {}
+        for recording in recordings:
+            day = recording.created_at.date()
+            if day >= oldest and recording.content_url not in busy and os.path.exists(recording.content_url):
+                days.setdefault(day, []).append(recording)
+
+        for day in sorted(days):
+            clips = [r.content_url for r in sorted(days[day], key=lambda r: r.created_at)]
+            self._update_day(day, clips)
+        self._prune(oldest)
+
+    def _update_day(self, day, clips):
+        base = self._base(day)
+        summary = self.path(day)
+        manifest_path = f"{base}.json"
+
+        manifest = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as file:
+                manifest = json.load(file)
+            if not isinstance(manifest, dict):
+                manifest = {}
+        failed = set(manifest.get("failed", []))
+
+        clips = [clip for clip in clips if clip not in failed]
+        if manifest.get("clips") == clips and (os.path.exists(summary) or not clips):
+            return
+
+        os.makedirs(base, exist_ok=True)
+        segments = []
+        for clip in clips:
+            segment = os.path.join(base, os.path.basename(clip))
+            if not os.path.exists(segment):
+                LOGGER.debug(f"adding {clip} to summary for {day}")
+                part = f"{segment}.part"
+                if not _concat([clip], part, ["-an", "-vf", f"setpts=PTS/{SUMMARY_SPEED}",
+                                              "-c:v", "libx264", "-preset", "veryfast", "-f", "mp4"]):
+                    if os.path.exists(part):
+                        os.unlink(part)
+                    failed.add(clip)
+                    continue
+                os.replace(part, segment)
+            segments.append((clip, segment))
+
+        if segments:
+            joined = f"{summary}.part"
+            if not _concat([segment for _, segment in segments], joined, ["-c", "copy", "-f", "mp4"]):
+                if os.path.exists(joined):
+                    os.unlink(joined)
+                return
+            os.replace(joined, summary)
+
+        with open(manifest_path, "w") as file:
+            json.dump({"clips": [clip for clip, _ in segments], "failed": sorted(failed)}, file)
+
+    def _prune(self, oldest):
+        """Delete the summaries, manifests and segments of days before `oldest`."""
+        prefix = self._prefix()
+        cut_off = oldest.strftime("%Y%m%d")
+        try:
+            entries = os.listdir(SUMMARY_DIR)
+        except OSError:
+            return
+        for entry in entries:
+            day = entry[len(prefix):len(prefix) + 8]
+            if not entry.startswith(prefix) or not day.isdigit() or day >= cut_off:
+                continue
+            path = os.path.join(SUMMARY_DIR, entry)
+            LOGGER.debug(f"pruning {path}")
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.unlink(path)
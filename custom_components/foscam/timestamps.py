@@ -0,0 +1,38 @@
+"""Read the capture time out of recording and snapshot names.
+
+Names look like `MDalarm_20230101_123456.avi`, or `MDAlarm_20230101-123456.jpg`
+for snapshots, the time is always the last 15 characters before the extension
+so it can be sliced out rather than parsed. Anything else goes through
+strptime. Results are cached by path, a crawl sees the same names every time.
+"""
+import os
+from datetime import datetime
+from functools import lru_cache
+
+CACHE_SIZE = 64 * 1024
+
+
+def packed_timestamp(path):
+    """Return the time in `path` as an integer, YYYYmmddHHMMSS."""
+    stem = path.rsplit(".", 1)[0]
+    if len(stem) >= 15 and stem[-7] in "_-" and stem[-15:-7].isdigit() and stem[-6:].isdigit():
+        return int(stem[-15:-7]) * 1000000 + int(stem[-6:])
+    return int(_strptime(path).strftime("%Y%m%d%H%M%S"))
+
+
+def _strptime(path):
+    filename = os.path.splitext(os.path.basename(path))[0]
+    filename = filename.replace("-", "_", 1).split("_", 1)[1]
+    return datetime.strptime(filename, "%Y%m%d_%H%M%S")
+
+
+def unpack(packed):
+    """Turn a packed timestamp back into a datetime."""
+    day, clock = divmod(packed, 1000000)
+    return datetime(day // 10000, day // 100 % 100, day % 100, clock // 10000, clock // 100 % 100, clock % 100)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_datetime(path):
+    """Return the capture time in `path` as a datetime."""
+    return unpack(packed_timestamp(path))
@@ -1,71 +1,245 @@
+import asyncio
+import bisect
 import time
 import os
+import subprocess
+import tempfile
 import threading
+from abc import ABC, abstractmethod
 from datetime import (
     datetime,
     timedelta
 )
 
 from ftpretty import ftpretty
+from libpyfoscam.foscam import (
+    ERROR_FOSCAM_UNAVAILABLE,
+)
 
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import (
     DataUpdateCoordinator,
 )
 from .const import (
     LOGGER
 )
+from .download import (
+    download
+)
+from .history import (
+    FIELDS as HISTORY_FIELDS,
+    TransitionHistory,
+)
 from .media import (
     Recording
 )
+from .profiler import (
+    Profiler
+)
+from .summary import (
+    DailySummaries
+)
+from .timestamps import (
+    parse_datetime
+)
 
 CHECK_TIMEOUT = 2
+STATE_INTERVAL = 5
+RECORDINGS_INTERVAL = 10
 RECORDINGS_TIMEOUT = 60
-TMP_AVI = "/config/foscam/in.avi"
 CUT_OFF_SECONDS = 10
+CONVERT_POLL_INTERVAL = 0.5
 RECENT_TIMEOUT = 30
-
-
-class Updater(DataUpdateCoordinator):
-    """An implementation of a camera state updater."""
-
-    def __init__( self, hass, camera, polling_interval):
-        """Initialize a Foscam camera data updater."""
-
+SUMMARY_INTERVAL = 300
+
+# Circuit breaker settings, failures before opening and the backoff range.
+FAILURE_THRESHOLD = 3
+BACKOFF_BASE = 10
+BACKOFF_MAX = 600
+
+# Where the recordings index comes from.
+INDEX_CGI = "cgi"
+INDEX_FTP = "ftp"
+
+RECORD_LIST_MAX_PAGES = 1000
+RECORD_LIST_ALL_TYPES = 0xffff
+RECORD_LIST_END_SLACK = 24 * 60 * 60
+# After the camera refuses the record list, how long until it's tried again.
+RECORD_LIST_RETRY = 6 * 60 * 60
+
+# Recordings index cache.
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = 30
+
+LIBRARY_LOADING = "loading"
+LIBRARY_CACHED = "cached"
+LIBRARY_READY = "ready"
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Track failures talking to a camera.
+
+    After FAILURE_THRESHOLD failures in a row the breaker opens and the camera
+    is left alone for an exponentially growing backoff. When that expires the
+    breaker is half open and a single cheap probe decides whether it closes
+    again or reopens with a longer backoff.
+    """
+
+    def __init__(self):
+        self._failures = 0
+        self._state = BREAKER_CLOSED
+        self._retry_at = 0.0
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def failures(self):
+        return self._failures
+
+    def retry_in(self, now):
+        if self._state != BREAKER_OPEN:
+            return 0
+        return max(int(self._retry_at - now), 0)
+
+    def allow(self, now):
+        """Return True if we can talk to the camera at all."""
+        if self._state == BREAKER_OPEN and now >= self._retry_at:
+            self._state = BREAKER_HALF_OPEN
+        return self._state != BREAKER_OPEN
+
+    def success(self):
+        if self._state != BREAKER_CLOSED:
+            LOGGER.info("camera reachable again")
+        self._failures = 0
+        self._state = BREAKER_CLOSED
+
+    def failure(self, now):
+        self._failures += 1
+        if self._state == BREAKER_HALF_OPEN or self._failures >= FAILURE_THRESHOLD:
+            backoff = min(BACKOFF_BASE * 2 ** max(self._failures - FAILURE_THRESHOLD, 0), BACKOFF_MAX)
+            if self._state == BREAKER_CLOSED:
+                LOGGER.warning(f"camera unreachable, backing off for {backoff}s")
+            self._state = BREAKER_OPEN
+            self._retry_at = now + backoff
+
+
+class FoscamUpdater(DataUpdateCoordinator, ABC):
+    """Common parts of the Foscam coordinators.
+
+    Subclasses do their blocking work in `update_data`, which runs in the io
+    pool unless `async_run_update` says otherwise, and return the entity data
+    from `build_data`. After each refresh
+    `changed` holds the keys that differ from the previous data.
+    """
+
+    def __init__(self, hass, camera, executors, name, polling_interval, breaker, profiler):
         super().__init__(
             hass=hass,
             logger=LOGGER,
-            name="FoscamUpdater",
+            name=name,
             update_interval=timedelta(seconds=polling_interval),
         )
 
         self._camera = camera
+        self._executors = executors
+        self._breaker = breaker
+
+        # keys that changed on the last update
+        self.changed = set()
+
+        self.profiler = profiler
+
+    def get_datetime(self, filename):
+        return parse_datetime(filename)
+
+    @abstractmethod
+    def update_data(self):
+        """Do the blocking work, runs in an executor."""
+
+    @abstractmethod
+    def build_data(self):
+        """Return the data the entities read from."""
+
+    def can_update(self, now):
+        return self._breaker.allow(now)
+
+    def profiled_update_data(self):
+        with self.profiler.cycle():
+            self.update_data()
+
+    async def _async_after_update(self, data):
+        """Hook run on the event loop once new data is built."""
+
+    async def async_run_update(self):
+        await self._executors.async_run_io(self.hass, self.profiled_update_data)
+
+    async def _async_update_data(self):
+        # Don't tie up an executor thread for a camera we know is down.
+        if self.can_update(time.monotonic()):
+            await self.async_run_update()
+        data = self.build_data()
+
+        # Work out what changed so entities can skip writing unchanged state.
+        previous = self.data or {}
+        self.changed = {key for key, value in data.items() if key not in previous or previous[key] != value}
+
+        await self._async_after_update(data)
+        return data
+
+    def connection_data(self):
+        return {
+            "connection": self._breaker.state,
+            "connection_failures": self._breaker.failures,
+            "connection_retry_in": self._breaker.retry_in(time.monotonic()),
+        }
+
+
+class Updater(FoscamUpdater):
+    """The fast coordinator, device state and alarms.
+
+    This is cheap, a single CGI call, so it runs every few seconds and doubles
+    as the circuit breaker's probe. It tells the recordings coordinator when
+    the camera starts or stops recording.
+    """
+
+    def __init__(self, hass, camera, executors, entry_id, recordings):
+        """Initialize a Foscam camera data updater."""
+        super().__init__(hass, camera, executors, "FoscamUpdater", STATE_INTERVAL,
+                         recordings.breaker, Profiler(hass, f"updater_{entry_id}"))
+
+        self._recordings = recordings
 
         # start up state
         self._state = "unknown"
-        self._last_update = 0
-        self._last_recording = 0
-        self._todays_count = 0
-        self._last_capture_at = None
         self._last_activity = 0.0
         self._dev_state = {}
-        self._recordings = []
+        self._recording_changed = False
 
-    def get_datetime(self, filename):
-        filename = os.path.splitext(os.path.basename(filename))[0]
-        filename = filename.replace("-", "_", 1).split("_", 1)[1]
-        return datetime.strptime(filename, "%Y%m%d_%H%M%S")
+        # recent state, motion, sound and io transitions
+        self.history = TransitionHistory()
 
     def update_dev_state(self):
-        ret, self._dev_state = self._camera.get_dev_state()
+        ret, dev_state = self._camera.get_dev_state()
+        if ret == 0:
+            self._dev_state = dev_state
         return ret
 
+    def is_recording(self):
+        return self._dev_state.get("record", self._dev_state.get("recording", "0")) == "1"
+
     def update_state(self):
         state = "idle"
 
         # Doing something?
-        if self._dev_state.get("recording", "0") == "1":
+        if self.is_recording():
             state = "recording"
-        elif self._dev_state["motionDetectAlarm"] == "2":
+        elif self._dev_state.get("motionDetectAlarm", "0") == "2":
             state = "motion"
 
         # Not doing something.But were we?
@@ -81,6 +255,151 @@ class Updater(DataUpdateCoordinator):
         # Set the new state
         self._state = state
 
+    def update_data(self):
+        """Fetch data from camera endpoint
+        """
+        now = time.monotonic()
+
+        # save pre-update state
+        recording = self.is_recording()
+
+        # update, this is also the probe when the breaker is half open
+        LOGGER.debug("update state")
+        try:
+            ret = self.update_dev_state()
+        except Exception as e:  # pylint: disable=broad-except
+            LOGGER.debug(f"dev state failed {e}")
+            ret = -1
+        if ret != 0:
+            self._breaker.failure(now)
+            return
+        self.update_state()
+        if self._breaker.state != BREAKER_CLOSED:
+            self._recordings.reconnected()
+        self._breaker.success()
+
+        # let the recordings side know as soon as recording starts or stops
+        if recording != self.is_recording():
+            LOGGER.debug(f"recording {'started' if self.is_recording() else 'stopped'}")
+            self._recordings.recording_changed(self.is_recording())
+            self._recording_changed = True
+
+    async def async_run_update(self):
+        # A single quick CGI call, it uses Home Assistant's executor so alarms
+        # keep coming while crawls and downloads fill the io pool.
+        await self.hass.async_add_executor_job(self.profiled_update_data)
+
+    async def _async_after_update(self, data):
+        at = time.time()
+        for field in HISTORY_FIELDS:
+            if field in self.changed:
+                self.history.record(at, field, data[field])
+
+        if self._recording_changed:
+            self._recording_changed = False
+            await self._recordings.async_request_refresh()
+
+    def build_data(self):
+        """Return the data the entities read from."""
+        return {
+            "motion_status": self._dev_state.get("motionDetectAlarm", "0") != "0",
+            "motion": self._dev_state.get("motionDetectAlarm", "0") == "2",
+            "sound_status": self._dev_state.get("soundAlarm", "0") == "0",
+            "sound": self._dev_state.get("soundAlarm", "0") == "2",
+            "io_status": self._dev_state.get("IOAlarm", "0") == "0",
+            "io": self._dev_state.get("IOAlarm", "0") == "2",
+            "recording": self.is_recording(),
+
+            "state": self._state,
+
+            **self.connection_data(),
+        }
+
+
+class RecordingsUpdater(FoscamUpdater):
+    """The slow coordinator, the recordings index and conversions.
+
+    It does the full index every RECORDINGS_TIMEOUT and in between fetches
+    one recording per tick. It leaves the camera alone while the breaker isn't
+    closed, the fast coordinator is the one probing.
+    """
+
+    def __init__(self, hass, camera, executors, entry_id, download_rate=0):
+        super().__init__(hass, camera, executors, "FoscamRecordingsUpdater", RECORDINGS_INTERVAL,
+                         CircuitBreaker(), Profiler(hass, f"recordings_{entry_id}"))
+
+        self._download_rate = download_rate
+
+        self._last_recording = 0
+        self._update_lock = threading.Lock()
+        self._todays_count = 0
+        self._last_capture_at = None
+        self._recordings = []
+        self._recordings_version = 0
+
+        # (created_at, remote path) of every snapshot, newest first, and the
+        # paths by file name for the gallery
+        self._snapshots = []
+        self._snapshot_paths = {}
+
+        # set from the fast coordinator's thread, guarded by _events_lock
+        self._events_lock = threading.Lock()
+        self._camera_recording = False
+        self._recording_started = False
+        self._crawl_requested = False
+
+        # the recordings index is cached so restarts don't wait for a crawl
+        self._store = Store(hass, STORAGE_VERSION, f"foscam.{entry_id}.recordings")
+        self._saved_version = 0
+        self._library = LIBRARY_LOADING
+        self._library_updated_at = None
+
+        # where recordings live and, while prewarmed, the open session and the
+        # directory being written to
+        self._record_dirs = []
+        self._index_source = None
+        # when to try the record list CGI again, None once its replies
+        # turned out not to be what we expect
+        self._record_list_retry_at = 0.0
+        self._crawl_seconds = None
+        self._ftp = None
+        self._watch_dir = None
+        # session the gallery fetches snapshots over
+        self._gallery_ftp = None
+        self._watch_seen = set()
+
+        # downloaded recordings waiting for, or going through, ffmpeg
+        self._to_convert = []
+        self._converting = set()
+        self._converting_lock = threading.Lock()
+
+        # daily summaries, rebuilt in the background every SUMMARY_INTERVAL
+        self.summaries = DailySummaries(entry_id)
+        self._summary_task = None
+        self._summary_at = 0.0
+
+    @property
+    def breaker(self):
+        return self._breaker
+
+    def can_update(self, now):
+        return self._breaker.state == BREAKER_CLOSED
+
+    def reconnected(self):
+        """Called by the fast coordinator when the camera comes back."""
+        with self._events_lock:
+            self._crawl_requested = True
+
+    def recording_changed(self, recording):
+        """Called by the fast coordinator when the camera starts or stops recording."""
+        with self._events_lock:
+            self._camera_recording = recording
+            if recording:
+                self._recording_started = True
+            elif self._watch_dir is None and not self._recording_started:
+                # nothing is watching for the clip, find it with a crawl
+                self._crawl_requested = True
+
     def update_recordings(self):
         res, devinfo = self._camera.get_dev_info()
         if res is not 0:
@@ -91,17 +410,60 @@ class Updater(DataUpdateCoordinator):
             LOGGER.error("failed to read device mac")
             return -1
 
-        self._camera.execute_command('startFtpServer')
-        ftp = ftpretty(self._camera.host, self._camera.usr, self._camera.pwd, port=50021)
-
-        today = datetime.now().date()
+        listed_at = datetime.now()
+        started = time.monotonic()
+
+        # Try the record list CGI, it's a few HTTP calls instead of walking
+        # every directory. A camera that can't be reached is tried again next
+        # crawl, one that refuses it after RECORD_LIST_RETRY and one whose
+        # replies don't check out never.
+        recordings = None
+        if self._record_list_retry_at is not None and started >= self._record_list_retry_at:
+            ret, recordings = self.list_recordings_cgi(mac, listed_at)
+            if ret == ERROR_FOSCAM_UNAVAILABLE:
+                LOGGER.debug("record list unavailable, indexing over ftp")
+            elif ret != 0:
+                LOGGER.info(f"record list refused ({ret}), indexing over ftp")
+                self._record_list_retry_at = started + RECORD_LIST_RETRY
+            elif recordings is None:
+                LOGGER.warning("record list not understood, indexing over ftp")
+                self._record_list_retry_at = None
+        if recordings is not None:
+            self._index_source = INDEX_CGI
+        else:
+            recordings = self.list_recordings_ftp(mac, listed_at)
+            self._index_source = INDEX_FTP
+
+        self._crawl_seconds = round(time.monotonic() - started, 2)
+        LOGGER.debug(f"indexed {len(recordings)} recordings over {self._index_source} in {self._crawl_seconds}s")
+
+        today = listed_at.replace(hour=0, minute=0, second=0, microsecond=0)
         todays_count = 0
         last_capture_at = None
+        for recording in recordings:
+            if recording.created_at >= today:
+                todays_count += 1
+            if last_capture_at is None or last_capture_at < recording.created_at:
+                last_capture_at = recording.created_at
+
+        self._update_index(recordings)
+        self._todays_count = todays_count
+        self._library = LIBRARY_READY
+        self._library_updated_at = listed_at.strftime("%Y-%m-%dT%H:%M:%S")
+        if last_capture_at is not None:
+            self._last_capture_at = last_capture_at.strftime("%Y-%m-%dT%H:%M:%S")
+        return 0
+
+    def list_recordings_ftp(self, mac, listed_at):
+        """Walk the camera's FTP tree for recordings and snapshots."""
+        ftp = self.ftp_connect()
 
         recordings = []
         snapshots = {}
+        record_dirs = []
         for possible_dir in ftp.list("/IPCamera"):
             if mac in possible_dir:
+                record_dirs.append(f"/IPCamera/{possible_dir}/record")
 
                 # Save out the snapshots.
                 for date1 in ftp.list(f"/IPCamera/{possible_dir}/snap"):
@@ -114,6 +476,7 @@ class Updater(DataUpdateCoordinator):
                             date = self.get_datetime(name)
 
                             snapshots[date] = name
+                snapshot_times = sorted(snapshots)
 
                 # Build recordings array.
                 for date1 in ftp.list(f"/IPCamera/{possible_dir}/record"):
@@ -125,122 +488,478 @@ class Updater(DataUpdateCoordinator):
                             name = f"/IPCamera/{possible_dir}/record/{date1}/{date2}/{recording['name']}"
                             date = self.get_datetime(name)
 
-                            # update counts
-                            LOGGER.debug(f"t1={date.date()},t2={today}")
-                            if date.date() == today:
-                                todays_count += 1
-                            if last_capture_at is None or last_capture_at < date:
-                                last_capture_at = date
-
-                            # find a thumbnail
-                            snapshot = [k for k in sorted(snapshots.keys()) if k > date]
-                            if snapshot:
-                                snapshot = snapshots[snapshot[0]]
+                            # find a thumbnail, the first snapshot after it started
+                            index = bisect.bisect_right(snapshot_times, date)
+                            snapshot = snapshots[snapshot_times[index]] if index < len(snapshot_times) else None
 
-                            recordings.append(Recording(date, name, snapshot, recording['size']))
+                            recordings.append(Recording(date, name, snapshot, recording['size'],
+                                                        recording['datetime'], listed_at))
 
         ftp.close()
 
-        self._recordings = sorted(recordings, key=lambda x: x.created_at, reverse=True)
-        self._todays_count = todays_count
-        if last_capture_at is not None:
-            self._last_capture_at = last_capture_at.strftime("%Y-%m-%dT%H:%M:%S")
-        return 0
+        snapshots = sorted(snapshots.items(), reverse=True)
+        if snapshots != self._snapshots:
+            self._snapshots = snapshots
+            self._snapshot_paths = {os.path.basename(path): path for _, path in snapshots}
+        self._record_dirs = record_dirs
+        return recordings
+
+    def list_recordings_cgi(self, mac, listed_at):
+        """Page through the SD card record list CGI.
+
+        Each record is expected as `path|size|start|end|type` with unix times.
+        The SD card path is mapped onto the FTP path so downloads still work,
+        recordings come without snapshots and get a thumbnail from the video
+        once converted.
+
+        Returns the camera's result code and the recordings. The recordings
+        are None if the reply doesn't look like that layout, see
+        `_check_record`, or if the first time it's used a listed size doesn't
+        match the FTP listing.
+        """
+        recordings = []
+        record_dirs = set()
+        start_no = 0
+        now = listed_at.timestamp()
+        try:
+            for _ in range(RECORD_LIST_MAX_PAGES):
+                ret, response = self._camera.execute_command('getRecordList', {
+                    'recordPath': '',
+                    'startTime': 0,
+                    'endTime': int(now) + RECORD_LIST_END_SLACK,
+                    'recordType': RECORD_LIST_ALL_TYPES,
+                    'startNo': start_no,
+                })
+                if ret != 0:
+                    return ret, None
+                if "totalCnt" not in response:
+                    return 0, None
+
+                count = int(response.get("curCnt", 0))
+                for i in range(count):
+                    fields = response[f"record{i}"].split("|")
+                    if len(fields) < 4:
+                        return 0, None
+                    parts = fields[0].split("/")
+                    base = [n for n, part in enumerate(parts) if mac in part]
+                    if not base or not parts[-1].endswith("avi"):
+                        continue
+                    name = "/IPCamera/" + "/".join(parts[base[0]:])
+                    size, start, end = int(fields[1]), int(fields[2]), int(fields[3])
+                    created_at = self.get_datetime(name)
+                    if not self._check_record(created_at, size, start, end, now):
+                        LOGGER.debug(f"unexpected record {response[f'record{i}']}")
+                        return 0, None
+                    record_dirs.add("/IPCamera/" + "/".join(parts[base[0]:base[0] + 2]))
+                    recordings.append(Recording(created_at, name, None, size,
+                                                datetime.fromtimestamp(end), listed_at))
+
+                start_no += count
+                if count == 0 or start_no >= int(response["totalCnt"]):
+                    break
+        except (KeyError, ValueError, OverflowError, OSError) as e:
+            LOGGER.debug(f"record list unreadable {e}")
+            return 0, None
+
+        if self._index_source != INDEX_CGI and recordings and not self._check_against_ftp(recordings):
+            return 0, None
+
+        self._record_dirs = sorted(record_dirs)
+        return 0, recordings
+
+    @staticmethod
+    def _check_record(created_at, size, start, end, now):
+        """Sanity check a record, the layout is a guess.
+
+        The size has to be positive, start and end in order and not in the
+        future, and the start close to the time in the file name.
+        """
+        return size > 0 and start <= end <= now + RECORD_LIST_END_SLACK and \
+            abs(created_at.timestamp() - start) <= RECORD_LIST_END_SLACK
+
+    def _check_against_ftp(self, recordings):
+        """Compare the oldest record's size with what FTP lists for it."""
+        oldest = min(recordings, key=lambda r: r.created_at)
+        directory, name = oldest.remote_content_url.rsplit("/", 1)
+        ftp = self.ftp_connect()
+        try:
+            listed = {f['name']: f['size'] for f in ftp.list(directory, extra=True)}
+        finally:
+            ftp.close()
+        if listed.get(name) != oldest.remote_size:
+            LOGGER.debug(f"record list says {oldest.remote_size} for {name}, ftp says {listed.get(name)}")
+            return False
+        return True
+
+    def _update_index(self, recordings):
+        """Swap in a new list of recordings, keeping the existing objects.
+
+        Only replace the list when its contents change, listeners check the
+        version instead of comparing every recording.
+        """
+        recordings = sorted(recordings, key=lambda x: x.created_at, reverse=True)
+        if [(r.remote_content_url, r.remote_size, r.remote_mtime) for r in recordings] == \
+                [(r.remote_content_url, r.remote_size, r.remote_mtime) for r in self._recordings]:
+            for old, new in zip(self._recordings, recordings):
+                old.update_remote(new.remote_size, new.remote_mtime, new.listed_at, new.remote_thumbnail_url)
+            return
+        existing = {r.remote_content_url: r for r in self._recordings}
+        self._recordings = [existing.get(r.remote_content_url, r) for r in recordings]
+        for recording in recordings:
+            if recording.remote_content_url in existing:
+                existing[recording.remote_content_url].update_remote(recording.remote_size,
+                                                                     recording.remote_mtime,
+                                                                     recording.listed_at,
+                                                                     recording.remote_thumbnail_url)
+        self._recordings_version += 1
+
+    def prewarm(self):
+        """Get ready for the recording that just started.
+
+        Start the FTP server, keep a session open and find the directory the
+        camera is writing to so only that needs listing until the clip is
+        converted.
+        """
+        if not self._record_dirs:
+            return
+        LOGGER.debug("prewarm")
+        if self._ftp is None:
+            self._ftp = self.ftp_connect()
+        record_dir = self._record_dirs[0]
+        date1 = max(self._ftp.list(record_dir), default=None)
+        if date1 is None:
+            return
+        date2 = max(self._ftp.list(f"{record_dir}/{date1}"), default=None)
+        if date2 is None:
+            return
+        self._watch_dir = f"{record_dir}/{date1}/{date2}"
+        self._watch_seen = {r.remote_content_url for r in self._recordings}
+
+    def watch_recordings(self):
+        """List just the watched directory and add anything new to the index.
+
+        Once the camera stops recording and every new clip has been claimed for
+        conversion the session is closed.
+        """
+        listed_at = datetime.now()
+        new = []
+        for recording in self._ftp.list(self._watch_dir, extra=True):
+            if not recording['name'].endswith("avi"):
+                continue
+            name = f"{self._watch_dir}/{recording['name']}"
+            new.append(Recording(self.get_datetime(name), name, None, recording['size'],
+                                 recording['datetime'], listed_at))
+
+        names = {r.remote_content_url for r in new}
+        self._update_index([r for r in self._recordings if r.remote_content_url not in names] + new)
+
+        fresh = [r for r in self._recordings if r.remote_content_url not in self._watch_seen]
+        if not self._camera_recording and \
+                all(os.path.exists(r.content_url) or r.content_url in self._converting for r in fresh):
+            LOGGER.debug("prewarm finished")
+            self.end_prewarm()
+
+    def end_prewarm(self):
+        self._watch_dir = None
+        if self._ftp is not None:
+            try:
+                self._ftp.close()
+            except Exception:  # pylint: disable=broad-except
+                pass
+            self._ftp = None
 
     def fetch_recordings(self):
+        """Download and queue the newest recording that isn't converted yet.
+
+        The size and modification time come from the last crawl. A recording
+        only counts as finished if its size didn't change between the last two
+        listings and it hadn't been touched for CUT_OFF_SECONDS when it was
+        listed, FTP times only go down to the minute. Anything else waits for
+        the next listing.
+
+        Nothing is fetched while the transcode pool has a backlog, so raw
+        downloads don't pile up on disk waiting for ffmpeg.
+        """
         LOGGER.debug("fetch recordings")
-        ftp = None
-        cut_off = datetime.now() - timedelta(seconds=CUT_OFF_SECONDS)
+        # claimed recordings are queued, downloading or converting
+        if len(self._converting) >= self._executors.transcode_workers:
+            LOGGER.debug(" waiting for conversions")
+            return
+        ftp = self._ftp
+        cut_off = timedelta(seconds=CUT_OFF_SECONDS)
 
         for recording in self._recordings:
-            if os.path.exists(recording.content_url):
+            if os.path.exists(recording.content_url) or recording.content_url in self._converting:
                 continue
 
-            if not ftp:
-                self._camera.execute_command('startFtpServer')
-                ftp = ftpretty(self._camera.host, self._camera.usr, self._camera.pwd, port=50021)
-
             LOGGER.debug(f"checking {recording.content_url}/{recording.remote_size}")
-            ls = ftp.list(recording.remote_content_url, extra=True)
-            if not ls:
-                LOGGER.debug(" file disappeared?")
-                continue
-            ls = ls[0]
-            if ls['datetime'] > cut_off:
+            if recording.remote_mtime is None or recording.listed_at is None or \
+                    recording.remote_mtime > recording.listed_at - cut_off:
                 LOGGER.debug(" too new")
                 continue
-            if ls['size'] == 0:
-                LOGGER.debug(" nothing in it")
-                continue
-            if ls['size'] != recording.remote_size:
+            if not recording.size_settled:
                 LOGGER.debug(" size changed!")
-                recording.update_remote_size(ls['size'])
+                continue
+            if recording.remote_size == 0:
+                LOGGER.debug(" nothing in it")
                 continue
 
-            LOGGER.debug(f"copying {recording.thumbnail_url}")
-            ftp.get(recording.remote_thumbnail_url, recording.thumbnail_url)
-
-            LOGGER.debug(f"creating {recording.content_url}")
-            ftp.get(recording.remote_content_url, TMP_AVI)
-            rc = os.system(f"ffmpeg -i {TMP_AVI} {recording.content_url}")
-            os.unlink(TMP_AVI)
-            if rc != 0:
-                LOGGER.warning(f"failed: ffmpeg -i {TMP_AVI} {recording.content_url}")
-                os.unlink(recording.content_url)
-            else:
-                LOGGER.debug(f"finished {recording.content_url}")
+            if not self.claim_recording(recording):
+                continue
+            if not ftp:
+                ftp = self.ftp_connect()
+            if self.download_recording(ftp, recording):
+                self._to_convert.append(recording)
             break
 
-        if ftp is not None:
+        if ftp is not None and ftp is not self._ftp:
             ftp.close()
 
-    def update_data(self):
-        """Fetch data from camera endpoint
+    def ftp_connect(self):
+        self._camera.execute_command('startFtpServer')
+        return ftpretty(self._camera.host, self._camera.usr, self._camera.pwd, port=50021)
+
+    def claim_recording(self, recording):
+        """Mark a recording as being converted, False if someone else has it."""
+        with self._converting_lock:
+            if recording.content_url in self._converting or os.path.exists(recording.content_url):
+                return False
+            self._converting.add(recording.content_url)
+            return True
+
+    def download_recording(self, ftp, recording):
+        """Fetch a claimed recording and its thumbnail, releases it on failure."""
+        try:
+            if recording.remote_thumbnail_url:
+                LOGGER.debug(f"copying {recording.thumbnail_url}")
+                ftp.get(recording.remote_thumbnail_url, recording.thumbnail_url)
+
+            if download(ftp, recording.remote_content_url, recording.download_url,
+                        recording.remote_size, self._download_rate):
+                return True
+        except Exception:
+            self._converting.discard(recording.content_url)
+            raise
+        self._converting.discard(recording.content_url)
+        return False
+
+    def prepare_recording(self, recording):
+        """Download a recording now, for callers that can't wait for the poll.
+
+        Returns True if the recording is downloaded and claimed, ready for
+        `convert_recording`. Recordings already converted or being converted
+        elsewhere return False.
         """
-        now = time.monotonic()
+        if not self.claim_recording(recording):
+            return False
+        ftp = self.ftp_connect()
+        try:
+            return self.download_recording(ftp, recording)
+        finally:
+            ftp.close()
 
-        # save pre-update state
-        recording = self._dev_state.get("recording", "0") == "1"
+    def snapshot_path(self, name):
+        """Return the remote path of the snapshot called `name`, None if there isn't one."""
+        return self._snapshot_paths.get(name)
 
-        # update
-        LOGGER.debug("update state")
-        self.update_dev_state()
-        self.update_state()
+    def fetch_snapshot(self, remote, local):
+        """Download one snapshot for the gallery.
 
-        # check post-update state
-        if recording and self._dev_state.get("recording", "0") != "1":
-            LOGGER.debug("recording stopped, forcing update")
-            self._last_recording = 0
+        The gallery keeps one FTP session open rather than logging in for
+        every image, callers take turns so only one fetch uses it at a time.
+        A session the camera has dropped is replaced and the fetch retried.
+        """
+        fd, part = tempfile.mkstemp(suffix=".part", dir=os.path.dirname(local))
+        os.close(fd)
+        try:
+            for attempt in range(2):
+                if self._gallery_ftp is None:
+                    self._gallery_ftp = self.ftp_connect()
+                try:
+                    self._gallery_ftp.get(remote, part)
+                    break
+                except Exception:  # pylint: disable=broad-except
+                    self.close_gallery()
+                    if attempt:
+                        raise
+            os.replace(part, local)
+        finally:
+            if os.path.exists(part):
+                os.unlink(part)
+
+    def close_gallery(self):
+        if self._gallery_ftp is not None:
+            try:
+                self._gallery_ftp.close()
+            except Exception:  # pylint: disable=broad-except
+                pass
+            self._gallery_ftp = None
+
+    async def async_wait_for_recording(self, recording, timeout):
+        """Wait for a conversion happening elsewhere to finish.
+
+        This polls on the event loop, a pool thread sleeping here for minutes
+        would hold up every camera's crawls and downloads.
+        """
+        end = time.monotonic() + timeout
+        while recording.content_url in self._converting and time.monotonic() < end:
+            await asyncio.sleep(CONVERT_POLL_INTERVAL)
+        return await self.hass.async_add_executor_job(os.path.exists, recording.content_url)
+
+    def convert_recording(self, recording):
+        """Convert a downloaded recording to mp4, runs in the transcode pool."""
+        LOGGER.debug(f"creating {recording.content_url}")
+        # Everything treats an existing mp4 as converted, so it only appears
+        # once ffmpeg has finished with it.
+        part = f"{recording.content_url}.part"
+        try:
+            result = subprocess.run(["ffmpeg", "-y", "-i", recording.download_url, "-f", "mp4", part],
+                                    stdin=subprocess.DEVNULL,
+                                    stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.DEVNULL)
+            if result.returncode != 0:
+                LOGGER.warning(f"failed: ffmpeg -i {recording.download_url} {recording.content_url}")
+                if os.path.exists(part):
+                    os.unlink(part)
+            else:
+                os.replace(part, recording.content_url)
+                LOGGER.debug(f"finished {recording.content_url}")
+                if not os.path.exists(recording.thumbnail_url):
+                    LOGGER.debug(f"creating {recording.thumbnail_url}")
+                    subprocess.run(["ffmpeg", "-y", "-i", recording.content_url, "-frames:v", "1",
+                                    recording.thumbnail_url],
+                                   stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL)
+        finally:
+            os.unlink(recording.download_url)
+            self._converting.discard(recording.content_url)
 
-        # check recordings
-        if (self._last_recording + RECORDINGS_TIMEOUT) < now:
-            LOGGER.debug("update recordings")
-            self.update_recordings()
-            self._last_recording = now
+    def update_data(self):
+        """Index and fetch recordings.
 
-        # grab one recording per go after initial setup
-        if self._last_update != 0:
+        The first crawl runs in the background, a scheduled refresh can come
+        along while it is still going. Rather than crawl twice it is skipped.
+        """
+        if not self._update_lock.acquire(blocking=False):
+            LOGGER.debug("recordings update already running")
+            return
+        try:
+            self._update_recordings_data()
+        finally:
+            self._update_lock.release()
+
+    def _update_recordings_data(self):
+        now = time.monotonic()
+        try:
+            # get ready to pick up the new clip as soon as it's written
+            with self._events_lock:
+                started, self._recording_started = self._recording_started, False
+            if started:
+                if self._watch_dir is None:
+                    self.prewarm()
+                # couldn't watch and it has already stopped, crawl for the clip
+                with self._events_lock:
+                    if self._watch_dir is None and not self._camera_recording:
+                        self._crawl_requested = True
+
+            # check recordings, a request made during the crawl isn't lost
+            with self._events_lock:
+                crawl = self._crawl_requested or (self._last_recording + RECORDINGS_TIMEOUT) < now
+                self._crawl_requested = False
+            if crawl:
+                LOGGER.debug("update recordings")
+                self.update_recordings()
+                self._last_recording = now
+
+            elif self._watch_dir is not None:
+                self.watch_recordings()
+
+            # grab one recording per go
             self.fetch_recordings()
+        except Exception as e:  # pylint: disable=broad-except
+            LOGGER.debug(f"recordings failed {e}")
+            self.end_prewarm()
+            self._breaker.failure(now)
+
+    async def _async_after_update(self, data):
+        # Conversion runs in the background so ffmpeg doesn't hold up polling.
+        while self._to_convert:
+            recording = self._to_convert.pop(0)
+            self.hass.async_create_task(
+                self._executors.async_run_transcode(self.hass, self.convert_recording, recording)
+            )
+        if self._recordings_version != self._saved_version:
+            self._saved_version = self._recordings_version
+            self._store.async_delay_save(self._cache_data, STORAGE_SAVE_DELAY)
 
-        self._last_update = now
-
-    async def _async_update_data(self):
-        await self.hass.async_add_executor_job(
-            self.update_data
-        )
+        now = time.monotonic()
+        if (self._summary_task is None or self._summary_task.done()) and self._summary_at < now:
+            self._summary_at = now + SUMMARY_INTERVAL
+            self._summary_task = self.hass.async_create_task(
+                self._executors.async_run_summary(self.hass, self.summaries.update, list(self._recordings),
+                                                  set(self._converting))
+            )
+
+    async def async_load_cache(self):
+        """Load the recordings index saved by a previous run.
+
+        This also gives the coordinator its first data, the first real refresh
+        happens in the background.
+        """
+        cache = await self._store.async_load()
+        if cache and not self._recordings:
+            self._load_cache(cache)
+        self.data = self.build_data()
+
+    def _load_cache(self, cache):
+        self._recordings = [
+            Recording(datetime.fromisoformat(r["created_at"]), r["recording"], r["snapshot"], r["size"],
+                      datetime.fromisoformat(r["mtime"]) if r.get("mtime") else None,
+                      datetime.fromisoformat(r["listed_at"]) if r.get("listed_at") else None)
+            for r in cache.get("recordings", [])
+        ]
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self._todays_count = len([r for r in self._recordings if r.created_at >= today])
+        if self._recordings:
+            self._last_capture_at = self._recordings[0].created_at.strftime("%Y-%m-%dT%H:%M:%S")
+        self._library = LIBRARY_CACHED
+        self._library_updated_at = cache.get("updated_at")
+        LOGGER.debug(f"loaded {len(self._recordings)} cached recordings")
+
+    def _cache_data(self):
         return {
-            "motion_status": self._dev_state["motionDetectAlarm"] != "0",
-            "motion": self._dev_state["motionDetectAlarm"] == "2",
-            "sound_status": self._dev_state["soundAlarm"] == "0",
-            "sound": self._dev_state["soundAlarm"] == "2",
-            "io_status": self._dev_state["IOAlarm"] == "0",
-            "io": self._dev_state["IOAlarm"] == "2",
-            "recording": self._dev_state["record"] == "1",
+            "updated_at": self._library_updated_at,
+            "recordings": [
+                {
+                    "created_at": r.created_at.isoformat(),
+                    "recording": r.remote_content_url,
+                    "snapshot": r.remote_thumbnail_url,
+                    "size": r.remote_size,
+                    "mtime": r.remote_mtime.isoformat() if r.remote_mtime else None,
+                    "listed_at": r.listed_at.isoformat() if r.listed_at else None,
+                }
+                for r in self._recordings
+            ],
+        }
 
+    def build_data(self):
+        """Return the data the entities read from.
+
+        The recordings list is passed by reference, `recordings_version` changes
+        whenever its contents do.
+        """
+        return {
             "recordings": self._recordings,
+            "recordings_version": self._recordings_version,
             "last": self._last_capture_at,
             "captured_today": self._todays_count,
             "captured_total": len(self._recordings),
+            "snapshots": self._snapshots,
+            "library": self._library,
+            "library_updated_at": self._library_updated_at,
+            "library_source": self._index_source,
+            "library_crawl_seconds": self._crawl_seconds,
 
-            "state": self._state
+            **self.connection_data(),
         }